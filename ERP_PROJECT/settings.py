@@ -150,6 +150,22 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Currency that ledger amounts and reports are kept in; documents in other
+# currencies are converted with the ExchangeRate table
+BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'USD')
+
+# Tax rate (percent) applied to sales orders created without an explicit rate
+DEFAULT_SALES_TAX_RATE = os.getenv('DEFAULT_SALES_TAX_RATE', '10')
+
+# Stock valuation method: 'fifo' or 'average' (moving weighted average)
+INVENTORY_VALUATION_METHOD = os.getenv('INVENTORY_VALUATION_METHOD', 'fifo')
+
+# How orders are split over warehouses: 'highest_stock', 'nearest' or 'fewest_splits'
+STOCK_ALLOCATION_RULE = os.getenv('STOCK_ALLOCATION_RULE', 'highest_stock')
+
+# Seconds product availability stays cached; stock changes clear it sooner
+STOCK_AVAILABILITY_TTL = int(os.getenv('STOCK_AVAILABILITY_TTL', '30'))
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -1,11 +1,16 @@
+from django import forms
 from django.contrib import admin
 from .models import (
     Customer, Vendor, Category, Product, Warehouse, Inventory,
     SalesOrder, SalesOrderItem, PurchaseOrder, PurchaseOrderItem,
-    ChartOfAccounts, JournalEntry, JournalLine,
+    ChartOfAccounts, JournalEntry, JournalLine, AccountPeriodBalance,
+    AccountingPeriod, PeriodClosingBalance, DocumentSequence,
     Department, Position, Employee,
-    InventoryTransaction, FinancialReport, Lead, LeadNote, EmailInquiry
+    InventoryTransaction, FinancialReport, Lead, LeadNote, EmailInquiry, PostingQueue,
+    ExchangeRate, CostLayer, StockValuationPeriod, StockSnapshot,
+    StockReservation, StockAlert, PriceList, PriceListItem
 )
+from .services import AccountingService
 
 # Customer & Vendor Admin
 @admin.register(Customer)
@@ -44,7 +49,7 @@ class WarehouseAdmin(admin.ModelAdmin):
 
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ['product', 'warehouse', 'quantity_on_hand', 'quantity_available', 'reorder_point']
+    list_display = ['product', 'warehouse', 'quantity_on_hand', 'quantity_available', 'reorder_point', 'stock_value']
     list_filter = ['warehouse', 'product__category']
     search_fields = ['product__name', 'product__sku']
 
@@ -61,6 +66,26 @@ class SalesOrderAdmin(admin.ModelAdmin):
     inlines = [SalesOrderItemInline]
     readonly_fields = ['id', 'updated_at']
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['order', 'product', 'warehouse', 'quantity', 'created_at']
+    list_filter = ['warehouse']
+    search_fields = ['order__order_number', 'product__name', 'product__sku']
+    readonly_fields = ['order', 'item', 'product', 'warehouse', 'quantity', 'created_at']
+
+class PriceListItemInline(admin.TabularInline):
+    model = PriceListItem
+    extra = 1
+    autocomplete_fields = ['product']
+
+@admin.register(PriceList)
+class PriceListAdmin(admin.ModelAdmin):
+    list_display = ['name', 'customer', 'customer_type', 'priority', 'valid_from', 'valid_to', 'is_active']
+    list_filter = ['customer_type', 'is_active']
+    search_fields = ['name', 'customer__name']
+    inlines = [PriceListItemInline]
+    readonly_fields = ['created_at', 'updated_at']
+
 # Purchase Admin
 class PurchaseOrderItemInline(admin.TabularInline):
     model = PurchaseOrderItem
@@ -81,17 +106,93 @@ class ChartOfAccountsAdmin(admin.ModelAdmin):
     list_filter = ['account_type', 'is_active']
     search_fields = ['account_code', 'account_name']
 
+# Posted entries are already counted in AccountPeriodBalance, which is only adjusted
+# when AccountingService posts, and entries in a closed period are covered by its
+# frozen PeriodClosingBalance rows; the admin may view them but not change or delete them
+def is_frozen(entry):
+    if entry is None:
+        return False
+    lock_date = AccountingService.get_lock_date()
+    return entry.is_posted or bool(lock_date and entry.date <= lock_date)
+
+class JournalEntryAdminForm(forms.ModelForm):
+    def clean_date(self):
+        entry_date = self.cleaned_data['date']
+        try:
+            AccountingService.check_period_open(entry_date)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return entry_date
+
 class JournalLineInline(admin.TabularInline):
     model = JournalLine
     extra = 2
 
+    def has_add_permission(self, request, obj=None):
+        return not is_frozen(obj) and super().has_add_permission(request, obj)
+
+    def has_change_permission(self, request, obj=None):
+        return not is_frozen(obj) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not is_frozen(obj) and super().has_delete_permission(request, obj)
+
 @admin.register(JournalEntry)
 class JournalEntryAdmin(admin.ModelAdmin):
+    form = JournalEntryAdminForm
     list_display = ['entry_number', 'date', 'description', 'entry_type', 'is_posted', 'total_debit', 'total_credit']
     list_filter = ['entry_type', 'is_posted', 'date', 'created_by']
     search_fields = ['entry_number', 'description']
     inlines = [JournalLineInline]
-    readonly_fields = ['id', 'created_at']
+    readonly_fields = ['id', 'created_at', 'is_posted']
+
+    def has_change_permission(self, request, obj=None):
+        return not is_frozen(obj) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not is_frozen(obj) and super().has_delete_permission(request, obj)
+
+@admin.register(AccountPeriodBalance)
+class AccountPeriodBalanceAdmin(admin.ModelAdmin):
+    list_display = ['account', 'period', 'period_debit', 'period_credit', 'closing_debit', 'closing_credit']
+    list_filter = ['period', 'account__account_type']
+    search_fields = ['account__account_code', 'account__account_name']
+    readonly_fields = ['updated_at']
+
+    # Maintained by AccountingService from posted journal lines
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class PeriodClosingBalanceInline(admin.TabularInline):
+    model = PeriodClosingBalance
+    extra = 0
+    readonly_fields = ['account', 'debit_total', 'credit_total', 'balance']
+
+@admin.register(AccountingPeriod)
+class AccountingPeriodAdmin(admin.ModelAdmin):
+    list_display = ['period_type', 'start_date', 'end_date', 'status', 'closed_at', 'closed_by']
+    list_filter = ['period_type', 'status']
+    inlines = [PeriodClosingBalanceInline]
+    readonly_fields = ['closing_entry', 'closed_at', 'closed_by']
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ['prefix', 'period', 'last_value', 'updated_at']
+    search_fields = ['prefix', 'period']
+    readonly_fields = ['updated_at']
+
+@admin.register(PostingQueue)
+class PostingQueueAdmin(admin.ModelAdmin):
+    list_display = ['document_type', 'document_id', 'status', 'journal_entry', 'attempts', 'created_at', 'posted_at']
+    list_filter = ['document_type', 'status']
+    search_fields = ['document_id', 'journal_entry__entry_number', 'error']
+    readonly_fields = ['journal_entry', 'attempts', 'error', 'created_at', 'posted_at']
 
 # HR Admin
 @admin.register(Department)
@@ -121,13 +222,47 @@ class InventoryTransactionAdmin(admin.ModelAdmin):
     search_fields = ['product__name', 'reference_number']
     readonly_fields = ['id', 'created_at']
 
+@admin.register(CostLayer)
+class CostLayerAdmin(admin.ModelAdmin):
+    list_display = ['product', 'warehouse', 'quantity', 'remaining_quantity', 'unit_cost', 'created_at']
+    list_filter = ['warehouse']
+    search_fields = ['product__name', 'product__sku']
+    readonly_fields = ['source', 'created_at']
+
+@admin.register(StockValuationPeriod)
+class StockValuationPeriodAdmin(admin.ModelAdmin):
+    list_display = ['product', 'warehouse', 'period', 'received_value', 'issued_value', 'adjustment_value', 'closing_value']
+    list_filter = ['period', 'warehouse']
+    search_fields = ['product__name', 'product__sku']
+
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+    list_display = ['product', 'warehouse', 'status', 'quantity_available', 'reorder_point', 'opened_at', 'resolved_at']
+    list_filter = ['status', 'warehouse']
+    search_fields = ['product__name', 'product__sku']
+    readonly_fields = ['opened_at', 'updated_at', 'resolved_at']
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['product', 'warehouse', 'date', 'received', 'shipped', 'adjusted', 'transferred', 'quantity_on_hand']
+    list_filter = ['warehouse']
+    search_fields = ['product__name', 'product__sku']
+    date_hierarchy = 'date'
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'rate_date', 'rate', 'created_at']
+    list_filter = ['currency']
+    search_fields = ['currency']
+    date_hierarchy = 'rate_date'
+
 # Financial Reports Admin
 @admin.register(FinancialReport)
 class FinancialReportAdmin(admin.ModelAdmin):
-    list_display = ['name', 'report_type', 'start_date', 'end_date', 'generated_at', 'generated_by']
+    list_display = ['name', 'report_type', 'start_date', 'end_date', 'generated_at', 'generated_by', 'ledger_watermark']
     list_filter = ['report_type', 'generated_at']
     search_fields = ['name']
-    readonly_fields = ['generated_at']
+    readonly_fields = ['generated_at', 'ledger_watermark']
 
 
 # Lead & Email Inquiry Management Admin
@@ -134,7 +134,8 @@ class SalesOrderItemForm(forms.ModelForm):
             'id': 'id_quantity'
         })
 
-        # Configure unit price field
+        # Configure unit price field; left blank, the view prices the line from the price lists
+        self.fields['unit_price'].required = False
         self.fields['unit_price'].widget.attrs.update({
             'class': 'form-control',
             'id': 'id_unit_price',
@@ -206,6 +207,11 @@ class PurchaseOrderForm(forms.ModelForm):
         self.fields['vendor'].queryset = Vendor.objects.filter(is_active=True)
         self.fields['warehouse'].queryset = Warehouse.objects.filter(is_active=True)
         self.fields['warehouse'].required = False
+        # Receipt statuses come from receiving goods; keep only the order's current one
+        self.fields['status'].choices = [
+            choice for choice in self.fields['status'].choices
+            if choice[0] not in PurchaseOrder.RECEIPT_STATUSES or choice[0] == self.instance.status
+        ]
         self.fields['payment_due_date'].required = False
         self.fields['tax_rate'].required = False
         self.fields['discount_percent'].required = False
@@ -303,14 +309,39 @@ class InventoryTransactionForm(forms.ModelForm):
     class Meta:
         model = InventoryTransaction
         fields = [
-            'transaction_type', 'product', 'warehouse', 'quantity',
+            'transaction_type', 'product', 'warehouse', 'to_warehouse', 'quantity',
             'unit_cost', 'reference_number', 'reference_type', 'notes'
         ]
         widgets = {
-            'quantity': forms.NumberInput(attrs={'min': 1}),
+            'quantity': forms.NumberInput(attrs={'step': 1}),
             'unit_cost': forms.NumberInput(attrs={'step': '0.01', 'min': '0'}),
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
+        help_texts = {
+            'quantity': 'Positive quantity; adjustments may be negative to correct stock down.',
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        transaction_type = cleaned_data.get('transaction_type')
+        quantity = cleaned_data.get('quantity')
+        to_warehouse = cleaned_data.get('to_warehouse')
+
+        if transaction_type == 'transfer':
+            if not to_warehouse:
+                self.add_error('to_warehouse', 'Select the warehouse to transfer to.')
+            elif to_warehouse == cleaned_data.get('warehouse'):
+                self.add_error('to_warehouse', 'The destination must differ from the source warehouse.')
+        elif to_warehouse:
+            cleaned_data['to_warehouse'] = None
+
+        if quantity is not None:
+            if quantity == 0:
+                self.add_error('quantity', 'Quantity cannot be zero.')
+            elif quantity < 0 and transaction_type != 'adjustment':
+                self.add_error('quantity', 'Only adjustments can have a negative quantity.')
+
+        return cleaned_data
 
 # Payment Forms
 class PaymentForm(forms.ModelForm):
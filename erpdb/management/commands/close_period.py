@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from erpdb.services import AccountingService
+
+
+class Command(BaseCommand):
+    help = 'Close an accounting month or year, freezing closing balances and locking posting'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--month', help='Month to close, as YYYY-MM')
+        group.add_argument('--year', type=int, help='Year to close; rolls revenue and expenses into retained earnings')
+        parser.add_argument('--user', help='Username recorded as closing the period')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        try:
+            if options['month']:
+                try:
+                    year, month = (int(part) for part in options['month'].split('-'))
+                except ValueError:
+                    raise CommandError('--month must be given as YYYY-MM')
+                period = AccountingService.close_month(year, month, user=user)
+            else:
+                period = AccountingService.close_year(options['year'], user=user)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Closed {period.period_type} {period.start_date} to {period.end_date} '
+            f'({period.closing_balances.count()} account balances frozen)'
+        ))
+        if period.closing_entry:
+            self.stdout.write(f'Year-end closing entry: {period.closing_entry.entry_number}')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from erpdb.models import SalesOrder
+from erpdb.services import AllocationService, SalesService
+
+
+class Command(BaseCommand):
+    help = 'Ship confirmed sales orders in batches, booking their stock out of the allocated warehouses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders shipped per transaction')
+        parser.add_argument('--limit', type=int, help='Ship at most this many orders')
+        parser.add_argument('--rule', choices=AllocationService.RULES,
+                            help='Allocation rule for orders without reservations (default STOCK_ALLOCATION_RULE)')
+        parser.add_argument('--user', help='Username recorded on the stock movements')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        order_ids = list(
+            SalesOrder.objects.filter(status='confirmed').order_by('order_date', 'pk').values_list('pk', flat=True)
+        )
+        if options['limit']:
+            order_ids = order_ids[:options['limit']]
+
+        shipped, failed = 0, 0
+        size = options['batch_size']
+        for start in range(0, len(order_ids), size):
+            orders = SalesOrder.objects.filter(pk__in=order_ids[start:start + size]).order_by('order_date', 'pk')
+            done, errors = SalesService.fulfil_orders(orders, user=user, rule=options['rule'])
+            shipped += len(done)
+            failed += len(errors)
+            for order in orders:
+                if order.pk in errors:
+                    self.stdout.write(self.style.WARNING(f'{order.order_number}: {errors[order.pk]}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Shipped {shipped} orders; {failed} could not be filled'))
@@ -0,0 +1,119 @@
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from erpdb.models import ChartOfAccounts, JournalEntry
+from erpdb.services import AccountingService
+
+
+class Command(BaseCommand):
+    help = (
+        'Import journal entries from a CSV file with columns entry_ref, date (YYYY-MM-DD), '
+        'description, entry_type, account_code, debit, credit, line_description. '
+        'Rows sharing an entry_ref form one entry.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file')
+        parser.add_argument('--user', help='Username recorded as creating the entries')
+        parser.add_argument('--batch-size', type=int, default=500, help='Entries posted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without posting')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        accounts = {account.account_code: account for account in ChartOfAccounts.objects.filter(is_active=True)}
+        entry_types = {choice[0] for choice in JournalEntry.ENTRY_TYPE_CHOICES}
+
+        # Group rows into entries, keeping file order
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row.get('entry_ref', '').strip(), []).append(row)
+
+        entries = []
+        failed = 0
+        for entry_ref, entry_rows in grouped.items():
+            entry_data, errors = self._parse_entry(entry_rows, accounts, entry_types)
+            if errors:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"{entry_ref or '(blank ref)'}: {'; '.join(errors)}"))
+            else:
+                entry_data['ref'] = entry_ref
+                entries.append(entry_data)
+
+        posted = 0
+        batch_size = max(options['batch_size'], 1)
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            if options['dry_run']:
+                lock_date = AccountingService.get_lock_date()
+                results = [(i, AccountingService.validate_journal_entry(e, lock_date)) for i, e in enumerate(batch)]
+                batch_errors = [(i, errors) for i, errors in results if errors]
+                posted += len(batch) - len(batch_errors)
+            else:
+                result = AccountingService.post_journal_entries(batch, user)
+                batch_errors = result['errors']
+                posted += len(result['posted'])
+
+            for index, errors in batch_errors:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"{batch[index]['ref']}: {'; '.join(errors)}"))
+
+        verb = 'Validated' if options['dry_run'] else 'Posted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {posted} journal entries'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} entries rejected'))
+
+    def _parse_entry(self, rows, accounts, entry_types):
+        errors = []
+        first = rows[0]
+
+        entry_date = None
+        try:
+            entry_date = datetime.strptime(first.get('date', '').strip(), '%Y-%m-%d').date()
+        except ValueError:
+            errors.append(f"invalid date '{first.get('date', '')}'")
+
+        entry_type = (first.get('entry_type') or 'manual').strip()
+        if entry_type not in entry_types:
+            errors.append(f"unknown entry type '{entry_type}'")
+
+        lines = []
+        for row in rows:
+            code = (row.get('account_code') or '').strip()
+            account = accounts.get(code)
+            if account is None:
+                errors.append(f"unknown account '{code}'")
+            try:
+                debit = Decimal((row.get('debit') or '0').strip() or '0')
+                credit = Decimal((row.get('credit') or '0').strip() or '0')
+            except InvalidOperation:
+                errors.append(f"invalid amount on account '{code}'")
+                continue
+            lines.append({
+                'account': account,
+                'debit': debit,
+                'credit': credit,
+                'description': (row.get('line_description') or '').strip(),
+            })
+
+        entry_data = {
+            'date': entry_date,
+            'description': (first.get('description') or '').strip(),
+            'entry_type': entry_type,
+            'lines': lines,
+        }
+        return entry_data, errors
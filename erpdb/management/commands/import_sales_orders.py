@@ -0,0 +1,60 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+from erpdb.services import SalesService
+
+
+class Command(BaseCommand):
+    help = (
+        'Import sales orders from a CSV file with one row per line and columns '
+        f"{', '.join(SalesService.IMPORT_COLUMNS)}, or from a JSON file of the form "
+        '{"orders": [{"reference", "customer", ..., "items": [{"sku", "quantity", ...}]}]}. '
+        'Rows sharing an order_ref make up one order.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Path to the CSV or JSON file')
+        parser.add_argument('--format', choices=['csv', 'json'], help='File format (default: from the extension)')
+        parser.add_argument('--user', help='Username recorded as creating the orders')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders created per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and create, then roll back')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        file_format = options['format'] or ('json' if options['file'].lower().endswith('.json') else 'csv')
+        try:
+            with open(options['file'], newline='', encoding='utf-8-sig') as import_file:
+                if file_format == 'json':
+                    data = json.load(import_file)
+                    orders = data.get('orders', []) if isinstance(data, dict) else data
+                else:
+                    orders = SalesService.orders_from_rows(csv.DictReader(import_file))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        created, failed = 0, 0
+        batch_size = max(options['batch_size'], 1)
+        for start in range(0, len(orders), batch_size):
+            with transaction.atomic():
+                batch, errors = SalesService.import_orders(orders[start:start + batch_size], user=user)
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+
+            created += len(batch)
+            for reference, error in errors.items():
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"Order {reference}: {error}"))
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {created} sales orders'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} orders rejected'))
@@ -0,0 +1,126 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+from erpdb.models import Product, Warehouse
+from erpdb.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply stock movements from a CSV file with columns transaction_type, sku, warehouse, '
+        'quantity, to_warehouse, unit_cost, reference_number, notes. Types are in, out, return, '
+        'adjustment, transfer and count (quantity is the counted stock level).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file')
+        parser.add_argument('--user', help='Username recorded as creating the movements')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Lines applied per transaction')
+        parser.add_argument('--allow-negative', action='store_true', help='Allow stock to go below zero')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and apply, then roll back')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        products = Product.objects.in_bulk(
+            {(row.get('sku') or '').strip() for row in rows}, field_name='sku'
+        )
+        warehouses = {warehouse.name: warehouse for warehouse in Warehouse.objects.filter(is_active=True)}
+
+        lines = []
+        failed = 0
+        for row_number, row in enumerate(rows, start=2):
+            line, errors = self._parse_line(row, products, warehouses)
+            if errors:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"Line {row_number}: {'; '.join(errors)}"))
+            else:
+                line['row_number'] = row_number
+                lines.append(line)
+
+        counts = {'applied': 0, 'unchanged': 0}
+        batch_size = max(options['batch_size'], 1)
+        for start in range(0, len(lines), batch_size):
+            batch = lines[start:start + batch_size]
+            with transaction.atomic():
+                results = InventoryService.apply_movements(
+                    batch, user=user, allow_negative=options['allow_negative']
+                )
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+
+            for line, result in zip(batch, results):
+                if result['status'] == 'error':
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"Line {line['row_number']}: {result['error']}"))
+                else:
+                    counts[result['status']] += 1
+
+        verb = 'Validated' if options['dry_run'] else 'Applied'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {counts['applied']} stock movements ({counts['unchanged']} counts already matched)"
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} lines rejected'))
+
+    def _parse_line(self, row, products, warehouses):
+        errors = []
+
+        transaction_type = (row.get('transaction_type') or '').strip().lower()
+        if transaction_type not in set(InventoryService.MOVEMENT_SIGNS) | {'count'}:
+            errors.append(f"unknown transaction type '{transaction_type}'")
+
+        sku = (row.get('sku') or '').strip()
+        product = products.get(sku)
+        if product is None:
+            errors.append(f"unknown SKU '{sku}'")
+
+        warehouse_name = (row.get('warehouse') or '').strip()
+        warehouse = warehouses.get(warehouse_name)
+        if warehouse is None:
+            errors.append(f"unknown warehouse '{warehouse_name}'")
+
+        to_warehouse = None
+        to_warehouse_name = (row.get('to_warehouse') or '').strip()
+        if to_warehouse_name:
+            to_warehouse = warehouses.get(to_warehouse_name)
+            if to_warehouse is None:
+                errors.append(f"unknown warehouse '{to_warehouse_name}'")
+
+        quantity = None
+        try:
+            quantity = int((row.get('quantity') or '').strip())
+        except ValueError:
+            errors.append(f"invalid quantity '{row.get('quantity', '')}'")
+
+        unit_cost = Decimal('0')
+        try:
+            unit_cost = Decimal((row.get('unit_cost') or '0').strip() or '0')
+        except InvalidOperation:
+            errors.append(f"invalid unit cost '{row.get('unit_cost', '')}'")
+
+        line = {
+            'transaction_type': transaction_type,
+            'product': product,
+            'warehouse': warehouse,
+            'to_warehouse': to_warehouse,
+            'quantity': quantity,
+            'unit_cost': unit_cost,
+            'reference_number': (row.get('reference_number') or '').strip() or None,
+            'notes': (row.get('notes') or '').strip() or None,
+        }
+        return line, errors
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from erpdb.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = 'Replan reorder points and quantities from recent outbound stock movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Days of demand history to use (default 90)')
+        parser.add_argument('--service-level', type=float, default=0.95,
+                            help='Target probability of not running out during the lead time (default 0.95)')
+        parser.add_argument('--review-days', type=int, default=30,
+                            help='Days of demand each reorder should cover (default 30)')
+        parser.add_argument('--dry-run', action='store_true', help='Plan without saving')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['review_days'] < 1:
+            raise CommandError('--days and --review-days must be at least 1')
+        if not 0 < options['service_level'] < 1:
+            raise CommandError('--service-level must be between 0 and 1')
+
+        planned = InventoryService.plan_reorder_levels(
+            days=options['days'],
+            service_level=options['service_level'],
+            review_days=options['review_days'],
+            commit=not options['dry_run'],
+        )
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} reorder levels for {len(planned)} stock rows'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from erpdb.services import PostingService
+
+
+class Command(BaseCommand):
+    help = 'Post queued invoices and payments to the general ledger in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Documents posted per transaction')
+        parser.add_argument('--user', help='Username recorded as creating the journal entries')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry documents that failed to post')
+        parser.add_argument('--enqueue-existing', action='store_true',
+                            help='Queue issued invoices and payments that were never queued first')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        if options['enqueue_existing']:
+            queued = PostingService.enqueue_existing()
+            self.stdout.write(f'Queued {queued} existing documents')
+
+        totals = {'posted': 0, 'failed': 0, 'dropped': 0}
+        retry_failed = options['retry_failed']
+        while True:
+            result = PostingService.post_pending(
+                batch_size=options['batch_size'], user=user, retry_failed=retry_failed
+            )
+            for key, count in result.items():
+                totals[key] += count
+            if result['posted'] + result['failed'] + result['dropped'] < options['batch_size']:
+                break
+            # Documents that failed in this run stay failed until the next run
+            retry_failed = False
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Posted {totals['posted']} documents, {totals['failed']} failed, {totals['dropped']} dropped"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from erpdb.services import AccountingService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized per-account period balances from posted journal lines'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding account period balances...')
+        count = AccountingService.rebuild_period_balances()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} account period balances'))
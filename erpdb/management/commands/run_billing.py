@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from erpdb.services import BillingService
+
+
+class Command(BaseCommand):
+    help = (
+        'Invoice confirmed and shipped orders that have no invoice yet, in chunks. '
+        'Use --from/--to to bill orders placed in a date range, e.g. for month-end billing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=['sales', 'purchase', 'all'], default='sales',
+                            help='Which orders to bill (default sales)')
+        parser.add_argument('--from', dest='start', help='First order date to bill (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', help='Last order date to bill (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Orders invoiced per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Create the invoices, then roll back')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        invoice_types = ['sales', 'purchase'] if options['type'] == 'all' else [options['type']]
+        size = max(options['chunk_size'], 1)
+        verb = 'Validated' if options['dry_run'] else 'Created'
+        for invoice_type in invoice_types:
+            order_ids = list(BillingService.unbilled_orders(invoice_type, start, end).values_list('pk', flat=True))
+            billed = 0
+            for offset in range(0, len(order_ids), size):
+                with transaction.atomic():
+                    invoices = BillingService.bill(invoice_type, order_ids[offset:offset + size])
+                    if options['dry_run']:
+                        transaction.set_rollback(True)
+                billed += len(invoices)
+                self.stdout.write(
+                    f'{invoice_type.capitalize()} orders: {min(offset + size, len(order_ids))}/{len(order_ids)} processed, '
+                    f'{billed} invoiced'
+                )
+
+            self.stdout.write(self.style.SUCCESS(f'{verb} {billed} {invoice_type} invoices'))
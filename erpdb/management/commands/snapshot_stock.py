@@ -0,0 +1,23 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from erpdb.services import StockHistoryService
+
+
+class Command(BaseCommand):
+    help = 'Write daily stock snapshots for every day since the last run (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help='Last day to snapshot, YYYY-MM-DD (default yesterday)')
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            try:
+                through = datetime.strptime(options['through'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--through must be a date in YYYY-MM-DD format')
+
+        count = StockHistoryService.build_snapshots(through)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {count} stock snapshots; latest snapshot day is {StockHistoryService.built_through()}'
+        ))
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_period_balances(apps, schema_editor):
+    JournalLine = apps.get_model('erpdb', 'JournalLine')
+    AccountPeriodBalance = apps.get_model('erpdb', 'AccountPeriodBalance')
+
+    monthly_totals = JournalLine.objects.filter(
+        journal__is_posted=True
+    ).annotate(
+        period=TruncMonth('journal__date')
+    ).values('account_id', 'period').annotate(
+        debit=Sum('debit'),
+        credit=Sum('credit')
+    ).order_by('account_id', 'period')
+
+    balances = []
+    current_account = None
+    closing_debit = closing_credit = Decimal('0')
+    for row in monthly_totals:
+        if row['account_id'] != current_account:
+            current_account = row['account_id']
+            closing_debit = closing_credit = Decimal('0')
+        closing_debit += row['debit'] or Decimal('0')
+        closing_credit += row['credit'] or Decimal('0')
+        balances.append(AccountPeriodBalance(
+            account_id=row['account_id'],
+            period=row['period'],
+            period_debit=row['debit'] or Decimal('0'),
+            period_credit=row['credit'] or Decimal('0'),
+            closing_debit=closing_debit,
+            closing_credit=closing_credit
+        ))
+    AccountPeriodBalance.objects.bulk_create(balances, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0003_remove_purchaseorder_payment_terms_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountPeriodBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('period_debit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('period_credit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('closing_debit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('closing_credit', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_balances', to='erpdb.chartofaccounts')),
+            ],
+            options={
+                'ordering': ['account', 'period'],
+                'unique_together': {('account', 'period')},
+            },
+        ),
+        migrations.RunPython(backfill_period_balances, migrations.RunPython.noop),
+    ]
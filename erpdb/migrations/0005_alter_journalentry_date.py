@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0004_accountperiodbalance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='journalentry',
+            name='date',
+            field=models.DateField(db_index=True),
+        ),
+    ]
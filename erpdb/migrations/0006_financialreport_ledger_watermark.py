@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:29
+
+import django.core.serializers.json
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0005_alter_journalentry_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialreport',
+            name='ledger_watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='financialreport',
+            name='data',
+            field=models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AddIndex(
+            model_name='financialreport',
+            index=models.Index(fields=['report_type', 'start_date', 'end_date'], name='erpdb_finan_report__eba13d_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0006_financialreport_ledger_watermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='journalentry',
+            name='entry_type',
+            field=models.CharField(choices=[('manual', 'Manual Entry'), ('sales', 'Sales Entry'), ('purchase', 'Purchase Entry'), ('payment', 'Payment Entry'), ('receipt', 'Receipt Entry'), ('adjustment', 'Adjustment Entry'), ('closing', 'Closing Entry')], default='manual', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='AccountingPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_type', models.CharField(choices=[('month', 'Month'), ('year', 'Year')], max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('status', models.CharField(choices=[('open', 'Open'), ('closed', 'Closed')], default='open', max_length=10)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closed_periods', to=settings.AUTH_USER_MODEL)),
+                ('closing_entry', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='erpdb.journalentry')),
+            ],
+            options={
+                'ordering': ['-end_date'],
+                'unique_together': {('period_type', 'start_date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodClosingBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='erpdb.chartofaccounts')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closing_balances', to='erpdb.accountingperiod')),
+            ],
+            options={
+                'unique_together': {('period', 'account')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_account_closure(apps, schema_editor):
+    ChartOfAccounts = apps.get_model('erpdb', 'ChartOfAccounts')
+    AccountClosure = apps.get_model('erpdb', 'AccountClosure')
+
+    parents = dict(ChartOfAccounts.objects.values_list('pk', 'parent_account_id'))
+    rows = []
+    for account_id in parents:
+        ancestor_id, depth = account_id, 0
+        while ancestor_id is not None and depth <= len(parents):
+            rows.append(AccountClosure(ancestor_id=ancestor_id, descendant_id=account_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    AccountClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0008_documentsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='erpdb.chartofaccounts')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='erpdb.chartofaccounts')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='erpdb_accou_descend_bb9fde_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(backfill_account_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:40
+
+import django.core.validators
+import erpdb.models
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0010_postingqueue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='currency',
+            field=models.CharField(default=erpdb.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='exchange_rate',
+            field=models.DecimalField(decimal_places=8, default=Decimal('1'), max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='journalline',
+            name='currency',
+            field=models.CharField(default=erpdb.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='journalline',
+            name='exchange_rate',
+            field=models.DecimalField(decimal_places=8, default=Decimal('1'), max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='currency',
+            field=models.CharField(default=erpdb.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='exchange_rate',
+            field=models.DecimalField(decimal_places=8, default=Decimal('1'), max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='currency',
+            field=models.CharField(default=erpdb.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='exchange_rate',
+            field=models.DecimalField(decimal_places=8, default=Decimal('1'), max_digits=18),
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('rate_date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18, validators=[django.core.validators.MinValueValidator(Decimal('1E-8'))])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['currency', '-rate_date'],
+                'unique_together': {('currency', 'rate_date')},
+            },
+        ),
+    ]
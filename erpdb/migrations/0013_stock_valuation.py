@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_opening_stock(apps, schema_editor):
+    """Value existing stock at product cost, as one opening layer per stock row"""
+    Inventory = apps.get_model('erpdb', 'Inventory')
+    CostLayer = apps.get_model('erpdb', 'CostLayer')
+
+    rows, layers = [], []
+    for inventory in Inventory.objects.filter(quantity_on_hand__gt=0).select_related('product'):
+        cost = inventory.product.cost_price
+        inventory.stock_value = inventory.quantity_on_hand * cost
+        rows.append(inventory)
+        layers.append(CostLayer(
+            product_id=inventory.product_id, warehouse_id=inventory.warehouse_id,
+            quantity=inventory.quantity_on_hand, remaining_quantity=inventory.quantity_on_hand, unit_cost=cost
+        ))
+    Inventory.objects.bulk_update(rows, ['stock_value'], batch_size=1000)
+    CostLayer.objects.bulk_create(layers, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0012_inventorytransaction_movement_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='stock_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('remaining_quantity', models.IntegerField()),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='erpdb.product')),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='erpdb.inventorytransaction')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='erpdb.warehouse')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['product', 'warehouse', 'remaining_quantity'], name='erpdb_costl_product_5ae34f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockValuationPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('received_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('issued_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('adjustment_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transfer_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('closing_quantity', models.IntegerField(default=0)),
+                ('closing_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valuation_periods', to='erpdb.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='erpdb.warehouse')),
+            ],
+            options={
+                'ordering': ['-period'],
+                'indexes': [models.Index(fields=['period'], name='erpdb_stock_period_57374c_idx')],
+                'unique_together': {('product', 'warehouse', 'period')},
+            },
+        ),
+        migrations.RunPython(backfill_opening_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0013_stock_valuation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='lead_time_days',
+            field=models.PositiveIntegerField(default=7),
+        ),
+    ]
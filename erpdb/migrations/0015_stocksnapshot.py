@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0014_product_lead_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('received', models.IntegerField(default=0)),
+                ('shipped', models.IntegerField(default=0)),
+                ('adjusted', models.IntegerField(default=0)),
+                ('transferred', models.IntegerField(default=0)),
+                ('quantity_on_hand', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='erpdb.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='erpdb.warehouse')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='erpdb_stock_date_0f82a0_idx'), models.Index(fields=['warehouse', 'date'], name='erpdb_stock_warehou_fb2e79_idx')],
+                'unique_together': {('product', 'warehouse', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_current_alerts(apps, schema_editor):
+    """Open an alert for every stock row already at or below its reorder point"""
+    Inventory = apps.get_model('erpdb', 'Inventory')
+    StockAlert = apps.get_model('erpdb', 'StockAlert')
+
+    StockAlert.objects.bulk_create([
+        StockAlert(
+            product_id=row.product_id, warehouse_id=row.warehouse_id,
+            quantity_available=row.quantity_available, reorder_point=row.reorder_point
+        )
+        for row in Inventory.objects.filter(quantity_available__lte=models.F('reorder_point'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0016_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('resolved', 'Resolved')], default='open', max_length=20)),
+                ('quantity_available', models.IntegerField()),
+                ('reorder_point', models.IntegerField()),
+                ('opened_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='erpdb.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='erpdb.warehouse')),
+            ],
+            options={
+                'ordering': ['-opened_at'],
+                'indexes': [models.Index(fields=['status', 'opened_at'], name='erpdb_stock_status_e4a807_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'open')), fields=('product', 'warehouse'), name='unique_open_stock_alert')],
+            },
+        ),
+        migrations.RunPython(open_current_alerts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+from django.db import migrations
+
+
+TAX_ACCOUNTS = [
+    ('140', 'Input Tax Receivable', 'asset', 'Tax paid on purchases, reclaimable'),
+    ('230', 'Sales Tax Payable', 'liability', 'Tax charged on sales, owed'),
+]
+
+
+def add_tax_accounts(apps, schema_editor):
+    ChartOfAccounts = apps.get_model('erpdb', 'ChartOfAccounts')
+    AccountClosure = apps.get_model('erpdb', 'AccountClosure')
+
+    # Fresh installs get these from create_default_chart_of_accounts
+    if not ChartOfAccounts.objects.exists():
+        return
+    for code, name, account_type, description in TAX_ACCOUNTS:
+        if ChartOfAccounts.objects.filter(account_code=code).exists():
+            continue
+        account = ChartOfAccounts.objects.create(
+            account_code=code, account_name=name, account_type=account_type, description=description
+        )
+        AccountClosure.objects.create(ancestor=account, descendant=account, depth=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('erpdb', '0020_stock_reservation_cascade'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_tax_accounts, migrations.RunPython.noop),
+    ]
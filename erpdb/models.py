@@ -1,10 +1,156 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
 from decimal import Decimal
+import time
 import uuid
 
+
+def default_currency():
+    return settings.BASE_CURRENCY
+
+
+# Documents whose lines changed inside deferred_totals(), by model
+_pending_totals = ContextVar('pending_totals', default=None)
+
+
+@contextmanager
+def deferred_totals():
+    """
+    Batch line edits on orders and invoices. Inside the block saving or
+    deleting a line only records its document; on leaving the block every
+    recorded document's totals are recalculated once, in SQL. Nested blocks
+    join the outermost one. Documents held in memory are not refreshed.
+    """
+    if _pending_totals.get() is not None:
+        yield
+        return
+    pending = {}
+    token = _pending_totals.set(pending)
+    try:
+        yield
+    finally:
+        _pending_totals.reset(token)
+    for model, pks in pending.items():
+        model.update_totals(pks)
+
+
+def defer_totals(model, pk):
+    """Record a document for recalculation when the enclosing deferred_totals() ends; False outside one"""
+    pending = _pending_totals.get()
+    if pending is None:
+        return False
+    pending.setdefault(model, set()).add(pk)
+    return True
+
+
+class StatusTracking:
+    """Remembers the status an order was loaded with, so saving it can tell a status change without re-reading the row"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_status = self.__dict__.get('status')
+
+    @property
+    def original_status(self):
+        """Status as last read from or written to the database; None for unsaved orders"""
+        return getattr(self, '_loaded_status', None)
+
+
+class CurrencyTracking:
+    """
+    Remembers the currency and exchange rate a document was created or loaded
+    with, so ExchangeRate.apply_rate can tell a rate entered by hand from one
+    it should look up. Subclasses name the date their rate is taken on.
+    """
+
+    rate_date_field = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # An unsaved document's rate is explicit when passed in or changed from the default
+        self._loaded_currency = None
+        self._loaded_rate = None if 'exchange_rate' in kwargs else self.__dict__.get('exchange_rate')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_currency()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_currency()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_currency()
+
+    def _remember_currency(self):
+        self._loaded_currency = self.__dict__.get('currency')
+        self._loaded_rate = self.__dict__.get('exchange_rate')
+
+    @property
+    def rate_is_explicit(self):
+        """Whether exchange_rate was entered rather than left at its default or loaded value"""
+        return self.__dict__.get('exchange_rate') != self._loaded_rate
+
+    @property
+    def currency_changed(self):
+        """Whether the currency differs from the one the document was loaded with; True for unsaved documents"""
+        return self._state.adding or self.currency != self._loaded_currency
+
+    def rate_date(self):
+        return getattr(self, self.rate_date_field) or timezone.localdate()
+
+    def clean(self):
+        super().clean()
+        # Report a missing rate as a form error instead of failing in save()
+        try:
+            ExchangeRate.apply_rate(self, self.rate_date())
+        except ValueError as e:
+            raise ValidationError({'currency': str(e)})
+
+
+def line_total_sum(item_model, parent_field):
+    """Subquery summing the line totals of each document, zero when it has no lines"""
+    line_totals = item_model.objects.filter(**{parent_field: models.OuterRef('pk')}).values(parent_field).annotate(
+        total=models.Sum('line_total')
+    ).values('total')
+    return Coalesce(
+        models.Subquery(line_totals), models.Value(Decimal('0')),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def update_order_totals(orders, item_model, parent_field):
+    """Recalculate subtotal, discount, tax and total for a queryset of sales or purchase orders"""
+    orders.update(subtotal=line_total_sum(item_model, parent_field))
+    # Second pass so the amounts below read the new subtotal
+    percent = models.Value(Decimal('0.01'))
+    discount_amount = models.F('subtotal') * models.F('discount_percent') * percent
+    tax_amount = (models.F('subtotal') - discount_amount) * models.F('tax_rate') * percent
+    orders.update(
+        discount_amount=discount_amount,
+        tax_amount=tax_amount,
+        total_amount=models.F('subtotal') - discount_amount + tax_amount,
+        updated_at=timezone.now(),
+    )
+
 # 1. Enhanced Customers & Vendors
 class Customer(models.Model):
     CUSTOMER_TYPE_CHOICES = [
@@ -41,16 +187,11 @@ class Customer(models.Model):
             year = timezone.now().strftime('%y')
             month = timezone.now().strftime('%m')
 
-            # Get the latest customer with a code from this year/month
-            latest_customer = Customer.objects.filter(
-                customer_code__startswith=f'C{year}{month}'
-            ).order_by('-customer_code').first()
-
-            if latest_customer:
-                # Extract the sequence number and increment it
-                sequence = int(latest_customer.customer_code[-4:]) + 1
-            else:
-                sequence = 1
+            # Take the next number from this year/month's sequence
+            sequence = DocumentSequence.next_value(
+                'C', f'{year}{month}',
+                seed=DocumentSequence.seed_from(Customer.objects.all(), 'customer_code', f'C{year}{month}')
+            )
 
             # Generate new code in format: CYYMM####
             self.customer_code = f'C{year}{month}{sequence:04d}'
@@ -93,16 +234,11 @@ class Vendor(models.Model):
             year = timezone.now().strftime('%y')
             month = timezone.now().strftime('%m')
 
-            # Get the latest vendor with a code from this year/month
-            latest_vendor = Vendor.objects.filter(
-                vendor_code__startswith=f'V{year}{month}'
-            ).order_by('-vendor_code').first()
-
-            if latest_vendor:
-                # Extract the sequence number and increment it
-                sequence = int(latest_vendor.vendor_code[-4:]) + 1
-            else:
-                sequence = 1
+            # Take the next number from this year/month's sequence
+            sequence = DocumentSequence.next_value(
+                'V', f'{year}{month}',
+                seed=DocumentSequence.seed_from(Vendor.objects.all(), 'vendor_code', f'V{year}{month}')
+            )
 
             # Generate new code in format: VYYMM####
             self.vendor_code = f'V{year}{month}{sequence:04d}'
@@ -139,6 +275,7 @@ class Product(models.Model):
     unit_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
     cost_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
     unit_of_measure = models.CharField(max_length=20, default='pcs')
+    lead_time_days = models.PositiveIntegerField(default=7)  # Supplier lead time used for reorder planning
     weight = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     dimensions = models.CharField(max_length=100, blank=True, null=True)
     barcode = models.CharField(max_length=50, blank=True, null=True, unique=True)
@@ -161,16 +298,11 @@ class Product(models.Model):
             year = timezone.now().strftime('%y')
             month = timezone.now().strftime('%m')
 
-            # Get the latest product with a SKU from this year/month and category
-            latest_product = Product.objects.filter(
-                sku__startswith=f'{category_code}{year}{month}'
-            ).order_by('-sku').first()
-
-            if latest_product:
-                # Extract the sequence number and increment it
-                sequence = int(latest_product.sku[-4:]) + 1
-            else:
-                sequence = 1
+            # Take the next number from this category's year/month sequence
+            sequence = DocumentSequence.next_value(
+                f'SKU-{category_code}', f'{year}{month}',
+                seed=DocumentSequence.seed_from(Product.objects.all(), 'sku', f'{category_code}{year}{month}')
+            )
 
             # Generate new SKU in format: CCYYMM#### (CC=category code)
             self.sku = f'{category_code}{year}{month}{sequence:04d}'
@@ -203,6 +335,7 @@ class Inventory(models.Model):
     quantity_available = models.IntegerField(default=0)
     reorder_point = models.IntegerField(default=0)
     reorder_quantity = models.IntegerField(default=0)
+    stock_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Cost of quantity on hand
     last_updated = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -217,7 +350,7 @@ class Inventory(models.Model):
 
 
 # 3. Enhanced Sales Module
-class SalesOrder(models.Model):
+class SalesOrder(StatusTracking, CurrencyTracking, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('pending', 'Pending'),
@@ -241,6 +374,9 @@ class SalesOrder(models.Model):
     discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, default=default_currency)
+    exchange_rate = models.DecimalField(max_digits=18, decimal_places=8, default=Decimal('1'))  # Base currency per unit
+    rate_date_field = 'order_date'
     notes = models.TextField(blank=True, null=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_sales_orders')
     updated_at = models.DateTimeField(auto_now=True)
@@ -255,62 +391,40 @@ class SalesOrder(models.Model):
         self.total_amount = subtotal_after_discount + self.tax_amount
         self.save()
 
+    @classmethod
+    def update_totals(cls, order_ids):
+        """Recalculate totals for many orders in SQL, summing each order's lines once"""
+        update_order_totals(cls.objects.filter(pk__in=order_ids), SalesOrderItem, 'order')
+
+    @transaction.atomic
     def create_invoice(self):
         """Create an invoice for this sales order"""
-        from datetime import date, timedelta
-
-        # Check if invoice already exists for this sales order
-        if hasattr(self, 'invoice_set') and self.invoice_set.exists():
-            return self.invoice_set.first()
-
-        # Create the invoice (let the Invoice model generate the number)
-        invoice = Invoice.objects.create(
-            invoice_type='sales',
-            status='sent',  # Automatically set to 'sent' since order is confirmed
-            invoice_date=date.today(),
-            due_date=date.today() + timedelta(days=30),  # 30 days payment term
-            subtotal=self.subtotal,
-            tax_rate=self.tax_rate,
-            tax_amount=self.tax_amount,
-            total_amount=self.total_amount,
-            customer=self.customer,
-            sales_order=self,
-            notes=f"Auto-generated from Sales Order {self.order_number}",
-            created_by=self.created_by
-        )
-
-        # Copy sales order items to invoice items
-        for order_item in self.items.all():
-            InvoiceItem.objects.create(
-                invoice=invoice,
-                product=order_item.product,
-                description=order_item.product.name,
-                quantity=order_item.quantity,
-                unit_price=order_item.unit_price,
-                line_total=order_item.line_total
-            )
-
-        # Recalculate invoice totals
-        invoice.calculate_totals()
-
+        # Lock the order so a billing run or another request cannot invoice it at the same time,
+        # then check for an invoice in a query that runs after the lock is granted
+        type(self).objects.select_for_update().filter(pk=self.pk).exists()
+        existing = self.invoice_set.first()
+        if existing is not None:
+            return existing
+
+        models.prefetch_related_objects([self], 'items__product')
+        invoice = Invoice.bill_orders([self], 'sales')[0]
+        invoice.refresh_from_db()
         return invoice
 
+    # Entering one of these statuses invoices the order
+    INVOICE_STATUSES = ('confirmed', 'shipped')
+
     def save(self, *args, **kwargs):
         # Check if status is changing to 'confirmed' or 'shipped'
-        old_status = None
-        if self.pk:
-            try:
-                old_instance = SalesOrder.objects.get(pk=self.pk)
-                old_status = old_instance.status
-            except SalesOrder.DoesNotExist:
-                # This is a new record, no status change to check
-                pass
+        old_status = self.original_status
 
+        ExchangeRate.apply_rate(self, self.rate_date())
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
 
         # Auto-create invoice when status changes to confirmed or shipped
         if (old_status and old_status != self.status and
-            self.status in ['confirmed', 'shipped'] and
+            self.status in self.INVOICE_STATUSES and
             self.total_amount > 0):
             self.create_invoice()
 
@@ -330,17 +444,78 @@ class SalesOrderItem(models.Model):
         self.line_total = (self.unit_price * self.quantity) - discount_amount
         super().save(*args, **kwargs)
         # Recalculate order totals when item is saved
-        self.order.calculate_totals()
+        if not defer_totals(SalesOrder, self.order_id):
+            self.order.calculate_totals()
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
 
+class StockReservation(models.Model):
+    """Stock held in a warehouse for a confirmed sales order line until it ships or is cancelled"""
+    order = models.ForeignKey(SalesOrder, on_delete=models.CASCADE, related_name='reservations')
+    item = models.ForeignKey(SalesOrderItem, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.order.order_number}: {self.product.name} x {self.quantity} in {self.warehouse.name}"
+
+class PriceList(models.Model):
+    """
+    Selling prices that override Product.unit_price. A list applies to every
+    customer, to one customer type or to a single customer, optionally only
+    between two dates (promotions). Where several lists price a product the
+    highest priority wins, then the lowest price.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True, related_name='price_lists')
+    customer_type = models.CharField(max_length=20, choices=Customer.CUSTOMER_TYPE_CHOICES, blank=True, default='')
+    priority = models.IntegerField(default=0)
+    valid_from = models.DateField(null=True, blank=True)
+    valid_to = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Process-local cache of resolved price breaks; entries expire so prices edited by other processes are picked up.
+    # Saves and deletes of lists and items, cascades included, clear it (erpdb.signals); queryset update()
+    # sends no signal, so call PriceList.clear_cache() after a bulk update
+    CACHE_SECONDS = 300
+    _cache = {}
+
+    class Meta:
+        ordering = ['-priority', 'name']
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache.clear()
+
+class PriceListItem(models.Model):
+    """A product's price on a price list from a minimum order quantity up"""
+    price_list = models.ForeignKey(PriceList, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='list_prices')
+    min_quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+
+    class Meta:
+        unique_together = ['price_list', 'product', 'min_quantity']
+        ordering = ['product', 'min_quantity']
+
+    def __str__(self):
+        return f"{self.price_list.name}: {self.product.name} from {self.min_quantity} at {self.unit_price}"
+
 # 4. Enhanced Purchases Module
-class PurchaseOrder(models.Model):
+class PurchaseOrder(StatusTracking, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
+        ('partially_received', 'Partially Received'),
         ('received', 'Received'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
@@ -377,66 +552,41 @@ class PurchaseOrder(models.Model):
         self.total_amount = subtotal_after_discount + self.tax_amount
         self.save()
 
+    @classmethod
+    def update_totals(cls, order_ids):
+        """Recalculate totals for many purchase orders in SQL, summing each order's lines once"""
+        update_order_totals(cls.objects.filter(pk__in=order_ids), PurchaseOrderItem, 'purchase_order')
+
+    @transaction.atomic
     def create_invoice(self):
         """Create an invoice for this purchase order"""
-        from datetime import date, timedelta
-
-        # Check if invoice already exists for this purchase order
-        if hasattr(self, 'invoice_set') and self.invoice_set.exists():
-            return self.invoice_set.first()
-
-        # Generate invoice number
-        last_invoice = Invoice.objects.order_by('-id').first()
-        next_id = (last_invoice.id if last_invoice else 0) + 1
-        invoice_number = f"INV{next_id:06d}"
-
-        # Create the invoice
-        invoice = Invoice.objects.create(
-            invoice_number=invoice_number,
-            invoice_type='purchase',
-            status='sent',  # Automatically set to 'sent' since order is confirmed
-            invoice_date=date.today(),
-            due_date=date.today() + timedelta(days=30),  # 30 days payment term
-            subtotal=self.subtotal,
-            tax_amount=self.tax_amount,
-            total_amount=self.total_amount,
-            vendor=self.vendor,
-            purchase_order=self,
-            notes=f"Auto-generated from Purchase Order {self.po_number}",
-            created_by=self.created_by
-        )
-
-        # Copy purchase order items to invoice items
-        for order_item in self.items.all():
-            InvoiceItem.objects.create(
-                invoice=invoice,
-                product=order_item.product,
-                description=order_item.product.name,
-                quantity=order_item.quantity,
-                unit_price=order_item.unit_price,
-                line_total=order_item.line_total
-            )
-
-        # Recalculate invoice totals
-        invoice.calculate_totals()
-
+        # Lock the order so a billing run or another request cannot invoice it at the same time,
+        # then check for an invoice in a query that runs after the lock is granted
+        type(self).objects.select_for_update().filter(pk=self.pk).exists()
+        existing = self.invoice_set.first()
+        if existing is not None:
+            return existing
+
+        models.prefetch_related_objects([self], 'items__product')
+        invoice = Invoice.bill_orders([self], 'purchase')[0]
+        invoice.refresh_from_db()
         return invoice
 
+    # Entering one of these statuses invoices the order
+    INVOICE_STATUSES = ('confirmed', 'received')
+    # Set only by receiving goods (PurchaseService), which books the stock in with them
+    RECEIPT_STATUSES = ('partially_received', 'received')
+
     def save(self, *args, **kwargs):
         # Check if status is changing to 'confirmed' or 'received'
-        old_status = None
-        if self.pk:
-            try:
-                old_instance = PurchaseOrder.objects.get(pk=self.pk)
-                old_status = old_instance.status
-            except PurchaseOrder.DoesNotExist:
-                pass
+        old_status = self.original_status
 
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
 
         # Auto-create invoice when status changes to confirmed or received
         if (old_status and old_status != self.status and
-            self.status in ['confirmed', 'received'] and
+            self.status in self.INVOICE_STATUSES and
             self.total_amount > 0):
             self.create_invoice()
 
@@ -457,7 +607,8 @@ class PurchaseOrderItem(models.Model):
         self.line_total = (self.unit_price * self.quantity) - discount_amount
         super().save(*args, **kwargs)
         # Recalculate order totals when item is saved
-        self.purchase_order.calculate_totals()
+        if not defer_totals(PurchaseOrder, self.purchase_order_id):
+            self.purchase_order.calculate_totals()
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
@@ -482,6 +633,85 @@ class ChartOfAccounts(models.Model):
     def __str__(self):
         return f"{self.account_code} - {self.account_name}"
 
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        previous_parent_id = None
+        if not is_new:
+            previous_parent_id = ChartOfAccounts.objects.filter(pk=self.pk).values_list(
+                'parent_account_id', flat=True
+            ).first()
+            if self.parent_account_id and AccountClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_account_id
+            ).exists():
+                raise ValueError("An account cannot be placed under one of its own sub-accounts")
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                AccountClosure.attach(self)
+            elif previous_parent_id != self.parent_account_id:
+                AccountClosure.move(self)
+
+class AccountClosure(models.Model):
+    """Ancestor/descendant pairs of the account tree, including each account with itself"""
+    ancestor = models.ForeignKey(ChartOfAccounts, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(ChartOfAccounts, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor} > {self.descendant} ({self.depth})"
+
+    @staticmethod
+    def _parent_paths(parent_id):
+        if parent_id is None:
+            return []
+        return list(AccountClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+
+    @classmethod
+    def attach(cls, account):
+        """Add the closure rows of a newly created account"""
+        cls.objects.bulk_create(
+            [cls(ancestor=account, descendant=account, depth=0)] + [
+                cls(ancestor_id=ancestor_id, descendant=account, depth=depth + 1)
+                for ancestor_id, depth in cls._parent_paths(account.parent_account_id)
+            ]
+        )
+
+    @classmethod
+    def move(cls, account):
+        """Re-link an account's whole subtree after its parent changed"""
+        subtree = list(cls.objects.filter(ancestor=account).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        # Drop the paths from the old ancestors, keep the paths inside the subtree
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        cls.objects.bulk_create([
+            cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+            for ancestor_id, ancestor_depth in cls._parent_paths(account.parent_account_id)
+            for descendant_id, depth in subtree
+        ])
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute the whole closure table from parent_account links"""
+        parents = dict(ChartOfAccounts.objects.values_list('pk', 'parent_account_id'))
+        rows = []
+        for account_id in parents:
+            ancestor_id, depth = account_id, 0
+            while ancestor_id is not None and depth <= len(parents):
+                rows.append(cls(ancestor_id=ancestor_id, descendant_id=account_id, depth=depth))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
 class JournalEntry(models.Model):
     ENTRY_TYPE_CHOICES = [
         ('manual', 'Manual Entry'),
@@ -490,11 +720,12 @@ class JournalEntry(models.Model):
         ('payment', 'Payment Entry'),
         ('receipt', 'Receipt Entry'),
         ('adjustment', 'Adjustment Entry'),
+        ('closing', 'Closing Entry'),
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     entry_number = models.CharField(max_length=20, unique=True)
-    date = models.DateField()
+    date = models.DateField(db_index=True)
     description = models.TextField()
     entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES, default='manual')
     total_debit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -510,12 +741,73 @@ class JournalLine(models.Model):
     journal = models.ForeignKey(JournalEntry, on_delete=models.CASCADE, related_name="lines")
     account = models.ForeignKey(ChartOfAccounts, on_delete=models.CASCADE)
     description = models.CharField(max_length=200, blank=True, null=True)
+    # Amounts are in the base currency; currency and rate record the source document's
     debit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     credit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, default=default_currency)
+    exchange_rate = models.DecimalField(max_digits=18, decimal_places=8, default=Decimal('1'))  # Base currency per unit
 
     def __str__(self):
         return f"{self.account.account_name} - {self.debit if self.debit else self.credit}"
 
+class AccountPeriodBalance(models.Model):
+    """Materialized monthly totals of posted journal lines per account"""
+    account = models.ForeignKey(ChartOfAccounts, on_delete=models.CASCADE, related_name='period_balances')
+    period = models.DateField()  # First day of the month
+    period_debit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    period_credit = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    closing_debit = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Cumulative through period end
+    closing_credit = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Cumulative through period end
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['account', 'period']
+        ordering = ['account', 'period']
+
+    def __str__(self):
+        return f"{self.account.account_code} - {self.period.strftime('%Y-%m')}"
+
+class AccountingPeriod(models.Model):
+    """Closed month or year; posting into a closed period is refused"""
+    PERIOD_TYPE_CHOICES = [
+        ('month', 'Month'),
+        ('year', 'Year'),
+    ]
+
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('closed', 'Closed'),
+    ]
+
+    period_type = models.CharField(max_length=10, choices=PERIOD_TYPE_CHOICES)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    closing_entry = models.ForeignKey(JournalEntry, on_delete=models.SET_NULL, null=True, blank=True)  # Year-end roll-forward
+    closed_at = models.DateTimeField(null=True, blank=True)
+    closed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='closed_periods')
+
+    class Meta:
+        unique_together = ['period_type', 'start_date']
+        ordering = ['-end_date']
+
+    def __str__(self):
+        return f"{self.get_period_type_display()} {self.start_date} to {self.end_date} ({self.status})"
+
+class PeriodClosingBalance(models.Model):
+    """Frozen cumulative account totals at the end of a closed period"""
+    period = models.ForeignKey(AccountingPeriod, on_delete=models.CASCADE, related_name='closing_balances')
+    account = models.ForeignKey(ChartOfAccounts, on_delete=models.CASCADE)
+    debit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['period', 'account']
+
+    def __str__(self):
+        return f"{self.account.account_code} @ {self.period.end_date}: {self.balance}"
+
 # 6. Enhanced HR Module
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -576,7 +868,10 @@ class InventoryTransaction(models.Model):
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPE_CHOICES)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
-    quantity = models.IntegerField()
+    to_warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name='incoming_transfers')  # Transfers only
+    quantity = models.IntegerField()  # Positive; adjustments are signed
+    quantity_after = models.IntegerField(null=True, blank=True)  # On hand in warehouse after the movement
     unit_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     reference_number = models.CharField(max_length=50, blank=True, null=True)
@@ -592,8 +887,101 @@ class InventoryTransaction(models.Model):
     def __str__(self):
         return f"{self.transaction_type} - {self.product.name} - {self.quantity}"
 
+class CostLayer(models.Model):
+    """A received lot of stock at one unit cost, consumed oldest first under FIFO valuation"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    source = models.ForeignKey(InventoryTransaction, on_delete=models.SET_NULL, null=True, blank=True)  # Empty for opening stock
+    quantity = models.IntegerField()
+    remaining_quantity = models.IntegerField()
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['product', 'warehouse', 'remaining_quantity']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.unit_cost}: {self.remaining_quantity}/{self.quantity}"
+
+class StockValuationPeriod(models.Model):
+    """Monthly stock value movements and closing value per product and warehouse"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='valuation_periods')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    period = models.DateField()  # First day of the month
+    received_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Receipts and returns
+    issued_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Cost of goods sold
+    adjustment_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transfer_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    closing_quantity = models.IntegerField(default=0)
+    closing_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['product', 'warehouse', 'period']
+        ordering = ['-period']
+        indexes = [
+            models.Index(fields=['period']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.warehouse.name} {self.period:%Y-%m}: {self.closing_value}"
+
+class StockAlert(models.Model):
+    """A stock row that fell to or below its reorder point; at most one open alert per row"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('resolved', 'Resolved'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_alerts')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    quantity_available = models.IntegerField()  # Latest seen while open
+    reorder_point = models.IntegerField()
+    opened_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-opened_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'warehouse'], condition=models.Q(status='open'), name='unique_open_stock_alert'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'opened_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.warehouse.name}: {self.quantity_available} ({self.status})"
+
+class StockSnapshot(models.Model):
+    """Closing stock of a product in a warehouse on a day it moved, built nightly from movements"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    date = models.DateField()
+    received = models.IntegerField(default=0)  # Stock in and returns
+    shipped = models.IntegerField(default=0)  # Stock out
+    adjusted = models.IntegerField(default=0)  # Signed
+    transferred = models.IntegerField(default=0)  # Signed, incoming less outgoing
+    quantity_on_hand = models.IntegerField(default=0)  # At the end of the day
+
+    class Meta:
+        unique_together = ['product', 'warehouse', 'date']
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['warehouse', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.warehouse.name} {self.date}: {self.quantity_on_hand}"
+
 # 8. Payment and Invoice Models
-class Payment(models.Model):
+class Payment(CurrencyTracking, models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('cash', 'Cash'),
         ('check', 'Check'),
@@ -618,6 +1006,9 @@ class Payment(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     receipt_generated = models.BooleanField(default=False)
     receipt_number = models.CharField(max_length=20, blank=True, null=True)
+    currency = models.CharField(max_length=3, default=default_currency)
+    exchange_rate = models.DecimalField(max_digits=18, decimal_places=8, default=Decimal('1'))  # Base currency per unit
+    rate_date_field = 'payment_date'
 
     # Related entities
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True)
@@ -629,26 +1020,27 @@ class Payment(models.Model):
     def save(self, *args, **kwargs):
         # Generate payment number if not set
         if not self.payment_number:
-            last_payment = Payment.objects.all().order_by('-payment_number').first()
-            if last_payment and last_payment.payment_number.startswith('PAY'):
-                last_number = int(last_payment.payment_number[3:])
-                self.payment_number = f'PAY{last_number+1:06d}'
-            else:
-                self.payment_number = 'PAY000001'
+            next_number = DocumentSequence.next_value(
+                'PAY', seed=DocumentSequence.seed_from(Payment.objects.all(), 'payment_number', 'PAY')
+            )
+            self.payment_number = f'PAY{next_number:06d}'
 
         # Auto-generate receipt number for customer payments
         if self.payment_type == 'receipt' and not self.receipt_number:
-            last_receipt = Payment.objects.filter(receipt_number__isnull=False).order_by('-receipt_number').first()
-            if last_receipt and last_receipt.receipt_number.startswith('RCPT'):
-                last_number = int(last_receipt.receipt_number[4:])
-                self.receipt_number = f'RCPT{last_number+1:06d}'
-            else:
-                self.receipt_number = 'RCPT000001'
+            next_number = DocumentSequence.next_value(
+                'RCPT', seed=DocumentSequence.seed_from(Payment.objects.all(), 'receipt_number', 'RCPT')
+            )
+            self.receipt_number = f'RCPT{next_number:06d}'
 
             self.receipt_generated = True
 
+        is_new = self._state.adding
+        ExchangeRate.apply_rate(self, self.rate_date())
         super().save(*args, **kwargs)
 
+        if is_new:
+            PostingQueue.enqueue('payment', self.pk)
+
         # Update invoice if it exists
         if self.invoice and self.payment_type == 'receipt':
             self.invoice.paid_amount += self.amount
@@ -666,7 +1058,7 @@ class Payment(models.Model):
     def __str__(self):
         return f"{self.payment_number} - {self.amount}"
 
-class Invoice(models.Model):
+class Invoice(CurrencyTracking, models.Model):
     INVOICE_TYPE_CHOICES = [
         ('sales', 'Sales Invoice'),
         ('purchase', 'Purchase Invoice'),
@@ -692,6 +1084,9 @@ class Invoice(models.Model):
     discount_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, default=default_currency)
+    exchange_rate = models.DecimalField(max_digits=18, decimal_places=8, default=Decimal('1'))  # Base currency per unit
+    rate_date_field = 'invoice_date'
     notes = models.TextField(blank=True, null=True)
     terms_and_conditions = models.TextField(blank=True, null=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -714,20 +1109,90 @@ class Invoice(models.Model):
             # Default to 30 days from invoice date
             from datetime import timedelta
             self.due_date = self.invoice_date + timedelta(days=30)
+        ExchangeRate.apply_rate(self, self.rate_date())
         super().save(*args, **kwargs)
 
+        # Issued invoices are posted to the general ledger by the posting queue
+        if self.status not in ('draft', 'cancelled'):
+            PostingQueue.enqueue('invoice', self.pk)
+
     def generate_invoice_number(self):
         """Generate unique invoice number"""
-        today = timezone.now().date()
-        prefix = 'SI' if self.invoice_type == 'sales' else 'PI'
+        self.invoice_number = Invoice.reserve_numbers(self.invoice_type, 1)[0]
+
+    @classmethod
+    def reserve_numbers(cls, invoice_type, count):
+        """Reserve `count` consecutive invoice numbers from today's sequence for the invoice type"""
+        prefix = 'SI' if invoice_type == 'sales' else 'PI'
+        day = timezone.now().date().strftime('%Y%m%d')
+
+        # Daily sequence per invoice type
+        first = DocumentSequence.reserve(
+            prefix, day, count=count,
+            seed=DocumentSequence.seed_from(Invoice.objects.all(), 'invoice_number', f"{prefix}-{day}-")
+        )
+        return [f"{prefix}-{day}-{number:04d}" for number in range(first, first + count)]
+
+    @classmethod
+    def bill_orders(cls, orders, invoice_type):
+        """
+        Invoice sales or purchase orders in bulk. Numbers are reserved in one
+        block, invoices and their lines are inserted with bulk_create, totals
+        are summed in SQL and the invoices are queued for posting together.
+        Orders should have items__product prefetched. Returns the invoices,
+        whose in-memory totals are not refreshed.
+        """
+        from datetime import timedelta
+
+        today = timezone.localdate()
+        invoices, lines = [], []
+        for order, number in zip(orders, cls.reserve_numbers(invoice_type, len(orders))):
+            # Sales invoices carry the order's currency and rate as an explicit rate
+            rate = {'currency': order.currency, 'exchange_rate': order.exchange_rate} if invoice_type == 'sales' else {}
+            invoice = cls(
+                invoice_number=number,
+                invoice_type=invoice_type,
+                status='sent',  # Automatically set to 'sent' since order is confirmed
+                invoice_date=today,
+                due_date=today + timedelta(days=30),  # 30 days payment term
+                tax_rate=order.tax_rate,
+                created_by_id=order.created_by_id,
+                **rate
+            )
+            if invoice_type == 'sales':
+                invoice.customer_id = order.customer_id
+                invoice.sales_order = order
+                invoice.notes = f"Auto-generated from Sales Order {order.order_number}"
+            else:
+                invoice.vendor_id = order.vendor_id
+                invoice.purchase_order = order
+                invoice.notes = f"Auto-generated from Purchase Order {order.po_number}"
+            ExchangeRate.apply_rate(invoice, today)
+            invoices.append(invoice)
+
+            # Copy order items to invoice items
+            lines.extend(
+                InvoiceItem(
+                    invoice=invoice,
+                    product=order_item.product,
+                    description=order_item.product.name,
+                    quantity=order_item.quantity,
+                    unit_price=order_item.unit_price,
+                    line_total=order_item.quantity * order_item.unit_price
+                )
+                for order_item in order.items.all()
+            )
 
-        # Count invoices of same type created today
-        count = Invoice.objects.filter(
-            invoice_type=self.invoice_type,
-            created_at__date=today
-        ).count() + 1
+        cls.objects.bulk_create(invoices)
+        InvoiceItem.objects.bulk_create(lines)
+        cls.update_totals([invoice.pk for invoice in invoices])
 
-        self.invoice_number = f"{prefix}-{today.strftime('%Y%m%d')}-{count:04d}"
+        # Issued invoices are posted to the general ledger by the posting queue
+        PostingQueue.objects.bulk_create(
+            [PostingQueue(document_type='invoice', document_id=invoice.pk) for invoice in invoices],
+            ignore_conflicts=True
+        )
+        return invoices
 
     def calculate_totals(self):
         """Calculate invoice totals from line items"""
@@ -737,6 +1202,18 @@ class Invoice(models.Model):
         self.total_amount = self.subtotal + self.tax_amount - self.discount_amount
         self.save()
 
+    @classmethod
+    def update_totals(cls, invoice_ids):
+        """Recalculate totals for many invoices in SQL, summing each invoice's lines once"""
+        invoices = cls.objects.filter(pk__in=invoice_ids)
+        invoices.update(subtotal=line_total_sum(InvoiceItem, 'invoice'))
+        tax_amount = models.F('subtotal') * models.F('tax_rate') * models.Value(Decimal('0.01'))
+        invoices.update(
+            tax_amount=tax_amount,
+            total_amount=models.F('subtotal') + tax_amount - models.F('discount_amount'),
+            updated_at=timezone.now(),
+        )
+
     @property
     def balance_due(self):
         """Return remaining balance"""
@@ -780,13 +1257,17 @@ class InvoiceItem(models.Model):
         self.line_total = self.quantity * self.unit_price
         super().save(*args, **kwargs)
         # Update invoice totals
-        self.invoice.calculate_totals()
+        if not defer_totals(Invoice, self.invoice_id):
+            self.invoice.calculate_totals()
 
     def delete(self, *args, **kwargs):
-        invoice = self.invoice
-        super().delete(*args, **kwargs)
+        deferred = defer_totals(Invoice, self.invoice_id)
+        invoice = None if deferred else self.invoice
+        result = super().delete(*args, **kwargs)
         # Update invoice totals after deletion
-        invoice.calculate_totals()
+        if invoice:
+            invoice.calculate_totals()
+        return result
 
     def __str__(self):
         return f"{self.description} - {self.quantity} x ${self.unit_price}"
@@ -806,7 +1287,13 @@ class FinancialReport(models.Model):
     end_date = models.DateField()
     generated_at = models.DateTimeField(auto_now_add=True)
     generated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    data = models.JSONField()  # Store report data as JSON
+    data = models.JSONField(encoder=DjangoJSONEncoder)  # Store report data as JSON
+    ledger_watermark = models.DateTimeField(null=True, blank=True)  # Latest ledger change the data reflects
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['report_type', 'start_date', 'end_date']),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.start_date} to {self.end_date}"
@@ -895,22 +1382,20 @@ class Lead(models.Model):
 
     def generate_lead_number(self):
         """Generate unique lead number"""
-        today = timezone.now().date()
-        count = Lead.objects.filter(created_at__date=today).count() + 1
-        self.lead_number = f"LEAD-{today.strftime('%Y%m%d')}-{count:04d}"
+        day = timezone.now().date().strftime('%Y%m%d')
+        count = DocumentSequence.next_value(
+            'LEAD', day,
+            seed=DocumentSequence.seed_from(Lead.objects.all(), 'lead_number', f"LEAD-{day}-")
+        )
+        self.lead_number = f"LEAD-{day}-{count:04d}"
 
     def convert_to_customer(self, user=None):
         """Convert lead to customer"""
         if self.converted_to_customer:
             return self.converted_to_customer
 
-        # Generate customer code
-        customer_count = Customer.objects.count() + 1
-        customer_code = f"CUST-{customer_count:05d}"
-
-        # Create customer
+        # Create customer (Customer.save assigns the code)
         customer = Customer.objects.create(
-            customer_code=customer_code,
             name=self.company if self.company else self.name,
             email=self.email,
             phone=self.phone,
@@ -1016,3 +1501,172 @@ class EmailInquiry(models.Model):
 
     def __str__(self):
         return f"{self.from_email} - {self.subject}"
+
+
+# 11. Document Numbering
+class DocumentSequence(models.Model):
+    """Counter row per document prefix and period that hands out document numbers"""
+    prefix = models.CharField(max_length=20)
+    period = models.CharField(max_length=10, blank=True, default='')
+    last_value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['prefix', 'period']
+        ordering = ['prefix', 'period']
+
+    def __str__(self):
+        return f"{self.prefix}{self.period}: {self.last_value}"
+
+    @classmethod
+    def reserve(cls, prefix, period='', count=1, seed=None):
+        """Reserve a block of `count` consecutive numbers and return the first one.
+
+        The increment takes a row lock held until the caller's transaction
+        commits, so concurrent writers queue on the counter instead of reusing
+        a number. `seed` is only called when the counter row does not exist
+        yet, to continue from numbers issued before the sequence was created.
+        """
+        counter = cls.objects.filter(prefix=prefix, period=period)
+        with transaction.atomic():
+            if not counter.update(last_value=models.F('last_value') + count):
+                start = seed() if seed else 0
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(prefix=prefix, period=period, last_value=start + count)
+                    return start + 1
+                except IntegrityError:
+                    # Another writer created the row first; queue behind it
+                    counter.update(last_value=models.F('last_value') + count)
+            return counter.values_list('last_value', flat=True).get() - count + 1
+
+    @classmethod
+    def next_value(cls, prefix, period='', seed=None):
+        return cls.reserve(prefix, period, count=1, seed=seed)
+
+    @staticmethod
+    def seed_from(queryset, field, code_prefix):
+        """Seed callable returning the numeric suffix of the highest existing code"""
+        def seed():
+            last = queryset.filter(**{f'{field}__startswith': code_prefix}).order_by(
+                f'-{field}'
+            ).values_list(field, flat=True).first()
+            suffix = last[len(code_prefix):] if last else ''
+            return int(suffix) if suffix.isdigit() else 0
+        return seed
+
+
+# 12. General Ledger Posting
+class PostingQueue(models.Model):
+    """Business documents waiting to be posted to the general ledger in batches"""
+    DOCUMENT_TYPE_CHOICES = [
+        ('invoice', 'Invoice'),
+        ('payment', 'Payment'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('posted', 'Posted'),
+        ('failed', 'Failed'),
+    ]
+
+    document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPE_CHOICES)
+    document_id = models.UUIDField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    journal_entry = models.ForeignKey(JournalEntry, on_delete=models.SET_NULL, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    posted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['document_type', 'document_id']
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.document_type} {self.document_id} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, document_type, document_id):
+        """Queue a document for posting; queuing it again is a no-op"""
+        cls.objects.bulk_create(
+            [cls(document_type=document_type, document_id=document_id)],
+            ignore_conflicts=True
+        )
+
+
+# 13. Currencies
+class ExchangeRate(models.Model):
+    """Value of one unit of a currency in the base currency, effective from rate_date"""
+    currency = models.CharField(max_length=3)
+    rate_date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8, validators=[MinValueValidator(Decimal('0.00000001'))])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Process-local rate cache; entries expire so rates edited by other processes are picked up
+    CACHE_SECONDS = 300
+    _cache = {}
+
+    class Meta:
+        unique_together = ['currency', 'rate_date']
+        ordering = ['currency', '-rate_date']
+
+    def __str__(self):
+        return f"{self.currency} {self.rate_date}: {self.rate}"
+
+    def save(self, *args, **kwargs):
+        self.currency = self.currency.upper()
+        super().save(*args, **kwargs)
+        ExchangeRate.clear_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        ExchangeRate.clear_cache()
+        return result
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache.clear()
+
+    @classmethod
+    def get_rate(cls, currency, on_date=None):
+        """Latest rate on or before a date, served from the cache when possible"""
+        if currency == settings.BASE_CURRENCY:
+            return Decimal('1')
+        if isinstance(on_date, datetime):
+            on_date = timezone.localdate(on_date)
+        on_date = on_date or timezone.localdate()
+
+        key = (currency, on_date)
+        cached = cls._cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        rate = cls.objects.filter(
+            currency=currency,
+            rate_date__lte=on_date
+        ).order_by('-rate_date').values_list('rate', flat=True).first()
+        if rate is None:
+            raise ValueError(f"No exchange rate for {currency} on or before {on_date}")
+
+        cls._cache[key] = (rate, time.monotonic() + cls.CACHE_SECONDS)
+        return rate
+
+    @classmethod
+    def apply_rate(cls, document, on_date=None):
+        """
+        Fill a document's exchange rate from the table unless one was entered
+        explicitly. A stored rate is kept while the currency stays the same;
+        changing the currency looks up the new one. Raises ValueError when no
+        rate is on file.
+        """
+        document.currency = (document.currency or settings.BASE_CURRENCY).upper()
+        if document.currency == settings.BASE_CURRENCY:
+            document.exchange_rate = Decimal('1')
+        elif document.exchange_rate and document.rate_is_explicit:
+            pass
+        elif not document.exchange_rate or document.currency_changed:
+            document.exchange_rate = cls.get_rate(document.currency, on_date)
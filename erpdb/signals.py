@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import ChartOfAccounts, FinancialReport, PriceList, PriceListItem, SalesOrder, SalesOrderItem
+from .services import SalesService
+
+
+# Orders and lines also go away through Customer and Product cascades and admin bulk
+# deletes; hand their reserved stock back before the reservations are removed
+@receiver(pre_delete, sender=SalesOrder)
+def release_order_reservations(sender, instance, **kwargs):
+    SalesService.release_order(instance)
+
+
+@receiver(pre_delete, sender=SalesOrderItem)
+def release_item_reservations(sender, instance, **kwargs):
+    SalesService.release_reservations(instance.reservations.all())
+
+
+# Signals also fire for admin bulk deletes and Product or Customer cascades, which bypass
+# Model.delete(); queryset update() still needs an explicit PriceList.clear_cache()
+@receiver([post_save, post_delete], sender=PriceList)
+@receiver([post_save, post_delete], sender=PriceListItem)
+def clear_price_cache(sender, **kwargs):
+    PriceList.clear_cache()
+
+
+# Stored statements carry account names and the account hierarchy, which the ledger
+# watermark does not see; queryset update() on the chart needs the same clean-up
+@receiver([post_save, post_delete], sender=ChartOfAccounts)
+def clear_stored_reports(sender, **kwargs):
+    FinancialReport.objects.all().delete()
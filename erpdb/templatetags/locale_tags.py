@@ -1,19 +1,23 @@
 from django import template
+from django.conf import settings
+from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
 register = template.Library()
 
 @register.filter
-def currency_attr(value):
+def currency_attr(value, currency=None):
     """
     Returns a data attribute for currency formatting.
-    Usage: {{ order.total_amount|currency_attr }}
+    Usage: {{ order.total_amount|currency_attr }} or {{ order.total_amount|currency_attr:order.currency }}
     """
     try:
         amount = float(value)
-        return mark_safe(f'<span data-currency="{amount}">${amount:,.2f}</span>')
     except (ValueError, TypeError):
         return value
+    currency = escape(currency or settings.BASE_CURRENCY)
+    label = f'${amount:,.2f}' if currency == 'USD' else f'{currency} {amount:,.2f}'
+    return mark_safe(f'<span data-currency="{amount}" data-source-currency="{currency}">{label}</span>')
 
 @register.filter
 def date_attr(value, include_time=False):
@@ -47,12 +47,16 @@ urlpatterns = [
 
     # API Endpoints for AJAX calls
     path('api/customer/<uuid:customer_id>/', views.get_customer_data, name='api_get_customer_data'),
+    path('api/products/availability/', views.api_product_availability, name='api_product_availability'),
+    path('api/sales-orders/import/', views.api_import_sales_orders, name='api_import_sales_orders'),
+    path('api/purchases/receive/', views.api_receive_purchase_orders, name='api_receive_purchase_orders'),
     path('api/product/<uuid:product_id>/', views.get_product_data, name='api_get_product_data'),
     path('api/product/<uuid:product_id>/price/', views.api_get_product_price, name='api_get_product_price'),
 
     # Sales Management
     path('sales/', views.sales_order_list, name='sales_order_list'),
     path('sales/create/', views.sales_order_create, name='sales_order_create'),
+    path('sales/bulk-status/', views.sales_order_bulk_status, name='sales_order_bulk_status'),
     path('sales/<uuid:order_id>/', views.sales_order_detail, name='sales_order_detail'),
     path('sales/<uuid:order_id>/change-status/', views.sales_order_change_status, name='sales_order_change_status'),
     path('sales/<uuid:order_id>/edit/', views.sales_order_edit, name='sales_order_edit'),
@@ -63,8 +67,10 @@ urlpatterns = [
     # Purchase Management
     path('purchases/', views.purchase_order_list, name='purchase_order_list'),
     path('purchases/create/', views.purchase_order_create, name='purchase_order_create'),
+    path('purchases/bulk-status/', views.purchase_order_bulk_status, name='purchase_order_bulk_status'),
     path('purchases/<uuid:order_id>/', views.purchase_order_detail, name='purchase_order_detail'),
     path('purchases/<uuid:order_id>/edit/', views.purchase_order_edit, name='purchase_order_edit'),
+    path('purchases/<uuid:order_id>/receive/', views.purchase_order_receive, name='purchase_order_receive'),
     path('purchases/<uuid:order_id>/delete/', views.purchase_order_delete, name='purchase_order_delete'),
     path('purchases/<uuid:order_id>/add-item/', views.purchase_order_add_item, name='purchase_order_add_item'),
     path('purchases/<uuid:order_id>/edit-item/<int:item_id>/', views.purchase_order_edit_item, name='purchase_order_edit_item'),
@@ -72,6 +78,8 @@ urlpatterns = [
 
     # Inventory Management
     path('inventory/', views.inventory_list, name='inventory_list'),
+    path('inventory/history/', views.stock_history, name='stock_history'),
+    path('inventory/alerts/', views.stock_alert_list, name='stock_alert_list'),
     path('inventory/transactions/', views.inventory_transaction_list, name='inventory_transaction_list'),
     path('inventory/transactions/create/', views.inventory_transaction_create, name='inventory_transaction_create'),
     
@@ -108,6 +116,8 @@ urlpatterns = [
 
     # Financial Reports
     path('financial-reports/', views.financial_reports, name='financial_reports'),
+    path('financial-reports/balance-sheet/', views.generate_balance_sheet, name='generate_balance_sheet'),
+    path('financial-reports/general-ledger/', views.general_ledger, name='general_ledger'),
 
     # Lead & Email Inquiry Management
     path('leads/', views.lead_list, name='lead_list'),
@@ -5,7 +5,8 @@ from django.contrib import messages
 from django.db.models import Sum, Count, Q, F, Value, Case, When
 from django.db.models.functions import Abs
 from django.db import models, transaction
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core import signing
 from django.core.paginator import Paginator
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -15,16 +16,30 @@ from .models import (
     SalesOrder, SalesOrderItem, PurchaseOrder, PurchaseOrderItem,
     ChartOfAccounts, JournalEntry, JournalLine,
     Department, Position, Employee, InventoryTransaction, FinancialReport,
-    Payment, Invoice, InvoiceItem
+    Payment, Invoice, InvoiceItem, DocumentSequence, StockAlert, deferred_totals, defer_totals
 )
 from .forms import (
     CustomerForm, VendorForm, ProductForm, SalesOrderForm, PurchaseOrderForm,
     JournalEntryForm, EmployeeForm, InventoryTransactionForm, CustomerSearchForm,
     ProductSearchForm, SalesOrderItemForm, PurchaseOrderItemForm, PaymentForm, InvoiceForm,
-    InvoiceReceiveForm, InvoiceItemFormSet, QuickInvoiceForm
+    InvoiceReceiveForm, InvoiceItemFormSet, QuickInvoiceForm, PurchaseOrderItemFormSet
+)
+from .services import (
+    FinancialReportService, AccountingService, InventoryService, StockHistoryService, SalesService,
+    StockAlertService, AvailabilityService, OrderWorkflow, PurchaseService, PricingService, base_amount
 )
+import csv
+import uuid
 from decimal import Decimal
 
+
+def next_document_number(prefix, queryset, field):
+    """Next PREFIX###### number from the prefix's document sequence"""
+    sequence = DocumentSequence.next_value(
+        prefix, seed=DocumentSequence.seed_from(queryset, field, prefix)
+    )
+    return f"{prefix}{sequence:06d}"
+
 # Dashboard Views
 @login_required
 def dashboard(request):
@@ -49,27 +64,23 @@ def dashboard(request):
         "total_sales_this_month": SalesOrder.objects.filter(
             order_date__date__gte=this_month_start,
             status__in=['completed', 'delivered']
-        ).aggregate(total=Sum('total_amount'))['total'] or 0,
+        ).aggregate(total=Sum(base_amount('total_amount')))['total'] or 0,
         
         "total_sales_last_month": SalesOrder.objects.filter(
             order_date__date__gte=last_month_start,
             order_date__date__lte=last_month_end,
             status__in=['completed', 'delivered']
-        ).aggregate(total=Sum('total_amount'))['total'] or 0,
+        ).aggregate(total=Sum(base_amount('total_amount')))['total'] or 0,
         
         "pending_orders": SalesOrder.objects.filter(status='pending').count(),
-        "low_stock_products": Inventory.objects.filter(
-            quantity_available__lte=F('reorder_point')
-        ).count(),
+        "low_stock_products": StockAlert.objects.filter(status='open').count(),
     })
     
     # Recent activities
     context.update({
         "recent_sales": SalesOrder.objects.select_related('customer').order_by('-order_date')[:5],
         "recent_purchases": PurchaseOrder.objects.select_related('vendor').order_by('-order_date')[:5],
-        "low_stock_items": Inventory.objects.select_related('product').filter(
-            quantity_available__lte=F('reorder_point')
-        )[:5],
+        "low_stock_items": StockAlertService.open_alerts()[:5],
     })
     
     return render(request, "erp/dashboard.html", context)
@@ -168,25 +179,7 @@ def customer_create(request):
         if form.is_valid():
             customer = form.save(commit=False)
             customer.created_by = request.user
-
-            # Generate customer code using the format CYYMM####
-            year = timezone.now().strftime('%y')
-            month = timezone.now().strftime('%m')
-
-            # Get the latest customer with a code from this year/month
-            latest_customer = Customer.objects.filter(
-                customer_code__startswith=f'C{year}{month}'
-            ).order_by('-customer_code').first()
-
-            if latest_customer:
-                # Extract the sequence number and increment it
-                sequence = int(latest_customer.customer_code[-4:]) + 1
-            else:
-                sequence = 1
-
-            # Generate new code in format: CYYMM####
-            customer.customer_code = f'C{year}{month}{sequence:04d}'
-
+            # Customer.save assigns the CYYMM#### code from the document sequence
             customer.save()
             messages.success(request, f'Customer {customer.name} created successfully.')
             return redirect('erp:customer_detail', customer_id=customer.id)
@@ -268,25 +261,7 @@ def vendor_create(request):
         if form.is_valid():
             vendor = form.save(commit=False)
             vendor.created_by = request.user
-
-            # Generate vendor code using the format VYYMM####
-            year = timezone.now().strftime('%y')
-            month = timezone.now().strftime('%m')
-
-            # Get the latest vendor with a code from this year/month
-            latest_vendor = Vendor.objects.filter(
-                vendor_code__startswith=f'V{year}{month}'
-            ).order_by('-vendor_code').first()
-
-            if latest_vendor:
-                # Extract the sequence number and increment it
-                sequence = int(latest_vendor.vendor_code[-4:]) + 1
-            else:
-                sequence = 1
-
-            # Generate new code in format: VYYMM####
-            vendor.vendor_code = f'V{year}{month}{sequence:04d}'
-
+            # Vendor.save assigns the VYYMM#### code from the document sequence
             vendor.save()
             messages.success(request, f'Vendor {vendor.name} created successfully.')
             return redirect('erp:vendor_detail', vendor_id=vendor.id)
@@ -476,9 +451,7 @@ def sales_order_create(request):
         if form.is_valid():
             order = form.save(commit=False)
             order.created_by = request.user
-            # Generate order number based on count
-            order_count = SalesOrder.objects.count() + 1
-            order.order_number = f"SO{order_count:06d}"
+            order.order_number = next_document_number('SO', SalesOrder.objects.all(), 'order_number')
             order.save()
             messages.success(request, f'Sales Order {order.order_number} created successfully.')
             return redirect('erp:sales_order_detail', order_id=order.id)
@@ -496,9 +469,18 @@ def sales_order_add_item(request, order_id):
         if form.is_valid():
             item = form.save(commit=False)
             item.order = order
-            item.save()
-            messages.success(request, 'Item added to sales order successfully.')
-            return redirect('erp:sales_order_detail', order_id=order.id)
+            # A price left blank comes from the customer's price lists; one entered is kept
+            if item.unit_price is None:
+                item.unit_price = PricingService.price(order.customer, item.product, item.quantity)
+            try:
+                with transaction.atomic():
+                    item.save()
+                    SalesService.refresh_reservations(order)
+            except ValueError as e:
+                form.add_error('quantity', str(e))
+            else:
+                messages.success(request, 'Item added to sales order successfully.')
+                return redirect('erp:sales_order_detail', order_id=order.id)
     else:
         form = SalesOrderItemForm()
 
@@ -506,24 +488,25 @@ def sales_order_add_item(request, order_id):
     products = Product.objects.filter(is_active=True).select_related('category')
 
     # Get inventory data for stock checking
-    inventory_data = {}
-    for product in products:
-        inventory = Inventory.objects.filter(product=product).aggregate(
-            total=models.Sum('quantity_on_hand'),
-            available=models.Sum('quantity_available'),
-            reserved=models.Sum('quantity_reserved')
-        )
-        inventory_data[str(product.id)] = {
-            'total': inventory['total'] or 0,
-            'available': inventory['available'] or 0,
-            'reserved': inventory['reserved'] or 0
-        }
+    stock = AvailabilityService.get_many(product.pk for product in products)
+    inventory_data = {
+        product_id: {'total': row['on_hand'], 'available': row['available'], 'reserved': row['reserved']}
+        for product_id, row in stock.items()
+    }
+
+    # The customer's quantity breaks, so the form can show the price for any quantity without a request
+    price_breaks = PricingService.breaks(order.customer, [product.pk for product in products])
+    price_breaks = {
+        str(product_id): [[min_quantity, float(unit_price)] for min_quantity, unit_price in steps]
+        for product_id, steps in price_breaks.items() if steps
+    }
 
     context = {
         'form': form,
         'order': order,
         'products': products,
         'inventory_data': inventory_data,
+        'price_breaks': json.dumps(price_breaks),
         'title': f'Add Item to Order {order.order_number}'
     }
     return render(request, 'erp/sales/add_item.html', context)
@@ -537,10 +520,21 @@ def sales_order_edit_item(request, order_id, item_id):
     if request.method == 'POST':
         form = SalesOrderItemForm(request.POST, instance=item)
         if form.is_valid():
-            item = form.save()
-            order.calculate_totals()
-            messages.success(request, 'Item updated successfully.')
-            return redirect('erp:sales_order_detail', order_id=order.id)
+            item = form.save(commit=False)
+            # Re-price a changed line unless the price itself was edited too
+            changed = set(form.changed_data)
+            if item.unit_price is None or ({'product', 'quantity'} & changed and 'unit_price' not in changed):
+                item.unit_price = PricingService.price(order.customer, item.product, item.quantity)
+            try:
+                with transaction.atomic():
+                    item.save()
+                    order.calculate_totals()
+                    SalesService.refresh_reservations(order)
+            except ValueError as e:
+                form.add_error('quantity', str(e))
+            else:
+                messages.success(request, 'Item updated successfully.')
+                return redirect('erp:sales_order_detail', order_id=order.id)
     else:
         form = SalesOrderItemForm(instance=item)
 
@@ -558,8 +552,12 @@ def sales_order_delete_item(request, order_id, item_id):
     item = get_object_or_404(SalesOrderItem, id=item_id, order=order)
 
     if request.method == 'POST':
-        item.delete()
-        order.calculate_totals()
+        with transaction.atomic():
+            SalesService.release_order(order)
+            item.delete()
+            order.calculate_totals()
+            if order.status == 'confirmed':
+                SalesService.reserve_order(order)
         messages.success(request, 'Item removed from sales order successfully.')
         return redirect('erp:sales_order_detail', order_id=order.id)
 
@@ -585,10 +583,12 @@ def sales_order_change_status(request, order_id):
             if new_status not in valid_statuses:
                 return JsonResponse({'error': 'Invalid status'}, status=400)
 
-            # Update the order status
+            # Update the order status, reserving, shipping or releasing its stock
             old_status = order.status
-            order.status = new_status
-            order.save()
+            try:
+                SalesService.change_status(order, new_status, request.user)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
 
             # Check if we should create an invoice (but don't create it automatically)
             should_create_invoice = False
@@ -617,6 +617,64 @@ def sales_order_change_status(request, order_id):
 
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+def bulk_order_status(request, kind, list_url):
+    """
+    Move many orders to one status. Accepts the list page's form (order_ids,
+    new_status) or a JSON body {"order_ids": [...], "new_status": "..."}, which
+    gets a JSON reply.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests allowed'}, status=405)
+
+    wants_json = request.content_type == 'application/json'
+    try:
+        if wants_json:
+            data = json.loads(request.body)
+            ids, new_status = data.get('order_ids') or [], data.get('new_status')
+        else:
+            ids, new_status = request.POST.getlist('order_ids'), request.POST.get('new_status')
+        order_ids = [uuid.UUID(str(value)) for value in ids]
+    except (ValueError, TypeError, AttributeError):
+        error = 'order_ids must be a list of order ids'
+    else:
+        error = None
+        if not order_ids:
+            error = 'Select at least one order'
+        elif len(order_ids) > 1000:
+            error = 'At most 1000 orders per request'
+        elif new_status not in OrderWorkflow.manual_statuses(kind):
+            error = 'Invalid status'
+
+    if error:
+        if wants_json:
+            return JsonResponse({'error': error}, status=400)
+        messages.error(request, error)
+        return redirect(list_url)
+
+    moved, errors = OrderWorkflow.bulk_transition(kind, order_ids, new_status, request.user)
+    if wants_json:
+        return JsonResponse({
+            'moved': [str(pk) for pk in moved],
+            'errors': {str(pk): message for pk, message in errors.items()},
+        })
+
+    if moved:
+        messages.success(request, f'{len(moved)} orders moved to {new_status}.')
+    for message in sorted(set(errors.values()))[:5]:
+        count = sum(1 for value in errors.values() if value == message)
+        messages.error(request, f'{count} orders not moved: {message}')
+    return redirect(list_url)
+
+@login_required
+def sales_order_bulk_status(request):
+    """Move the selected sales orders to one status"""
+    return bulk_order_status(request, 'sales', 'erp:sales_order_list')
+
+@login_required
+def purchase_order_bulk_status(request):
+    """Move the selected purchase orders to one status"""
+    return bulk_order_status(request, 'purchase', 'erp:purchase_order_list')
+
 # Purchase Management Views
 @login_required
 def purchase_order_list(request):
@@ -634,7 +692,9 @@ def purchase_order_list(request):
     context = {
         'orders': page_obj,
         'total_orders': orders.count(),
-        'status_choices': PurchaseOrder.STATUS_CHOICES,
+        'status_choices': [
+            choice for choice in PurchaseOrder.STATUS_CHOICES if choice[0] not in PurchaseOrder.RECEIPT_STATUSES
+        ],
         'selected_status': status,
     }
     return render(request, 'erp/purchases/list.html', context)
@@ -650,6 +710,81 @@ def purchase_order_detail(request, order_id):
     }
     return render(request, 'erp/purchases/detail.html', context)
 
+@login_required
+def purchase_order_receive(request, order_id):
+    """Record goods received against a purchase order's lines"""
+    order = get_object_or_404(PurchaseOrder.objects.select_related('vendor', 'warehouse'), id=order_id)
+    items = list(PurchaseOrderItem.objects.filter(purchase_order=order).select_related('product'))
+    for item in items:
+        item.outstanding = item.quantity - item.received_quantity
+
+    if request.method == 'POST':
+        receipts, invalid = {}, []
+        for item in items:
+            value = request.POST.get(f'receive_{item.pk}', '').strip()
+            if not value or value == '0':
+                continue
+            try:
+                receipts[item.pk] = int(value)
+            except ValueError:
+                invalid.append(item.product.name)
+        if invalid:
+            messages.error(request, f"Invalid quantity for {', '.join(invalid)}")
+        elif not receipts:
+            messages.error(request, 'Enter the quantity received for at least one item.')
+        else:
+            try:
+                statuses, errors = PurchaseService.receive_items(receipts, request.user)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                for error in errors.values():
+                    messages.error(request, error)
+                if statuses:
+                    messages.success(request, f'Goods received for purchase order {order.po_number}.')
+                    return redirect('erp:purchase_order_detail', order_id=order.id)
+
+    context = {
+        'order': order,
+        'items': items,
+        'title': f'Receive Purchase Order {order.po_number}',
+    }
+    return render(request, 'erp/purchases/receive.html', context)
+
+@login_required
+def api_receive_purchase_orders(request):
+    """
+    Receive goods for many purchase orders in one request. JSON body:
+    {"lines": [{"item_id": 1, "quantity": 5}, ...], "orders": ["<po uuid>", ...]}
+    where each listed order is received in full.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        receipts = {int(line['item_id']): line['quantity'] for line in data.get('lines') or []}
+        order_ids = [uuid.UUID(str(value)) for value in data.get('orders') or []]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Expected {"lines": [{"item_id", "quantity"}], "orders": [ids]}'}, status=400)
+    if len(receipts) + len(order_ids) > 5000:
+        return JsonResponse({'error': 'At most 5000 lines and orders per request'}, status=400)
+
+    try:
+        with transaction.atomic():
+            statuses, errors = PurchaseService.receive_items(receipts, request.user) if receipts else ({}, {})
+            if order_ids:
+                more_statuses, more_errors = PurchaseService.receive_orders(order_ids, request.user)
+                statuses.update(more_statuses)
+                errors.update(more_errors)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'orders': {str(pk): status for pk, status in statuses.items()},
+        'errors': {str(item_id): error for item_id, error in errors.items()},
+    })
+
 @login_required
 def purchase_order_create(request):
     if request.method == 'POST':
@@ -657,9 +792,7 @@ def purchase_order_create(request):
         if form.is_valid():
             order = form.save(commit=False)
             order.created_by = request.user
-            # Generate order number based on count (not UUID)
-            order_count = PurchaseOrder.objects.count() + 1
-            order.po_number = f"PO{order_count:06d}"
+            order.po_number = next_document_number('PO', PurchaseOrder.objects.all(), 'po_number')
             order.save()
             messages.success(request, f'Purchase Order {order.po_number} created successfully.')
             return redirect('erp:purchase_order_detail', order_id=order.id)
@@ -729,16 +862,30 @@ def purchase_order_delete_item(request, order_id, item_id):
 def purchase_order_edit(request, order_id):
     """Edit purchase order"""
     order = get_object_or_404(PurchaseOrder, id=order_id)
+    old_status = order.status
 
     if request.method == 'POST':
         form = PurchaseOrderForm(request.POST, instance=order)
         formset = PurchaseOrderItemFormSet(request.POST, instance=order)
 
         if form.is_valid() and formset.is_valid():
-            order = form.save()
-            formset.save()
-            messages.success(request, f'Purchase Order {order.po_number} updated successfully.')
-            return redirect('erp:purchase_order_detail', order_id=order.id)
+            new_status = form.cleaned_data['status']
+            try:
+                with transaction.atomic():
+                    with deferred_totals():
+                        # Keep the committed status; the workflow moves it below
+                        order.status = PurchaseOrder.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+                        order = form.save()
+                        formset.save()
+                        defer_totals(PurchaseOrder, order.pk)
+                    # The status moves last so invoicing sees the new totals
+                    order.refresh_from_db()
+                    OrderWorkflow.transition(order, new_status, request.user)
+            except ValueError as e:
+                form.add_error('status', str(e))
+            else:
+                messages.success(request, f'Purchase Order {order.po_number} updated successfully.')
+                return redirect('erp:purchase_order_detail', order_id=order.id)
     else:
         form = PurchaseOrderForm(instance=order)
         formset = PurchaseOrderItemFormSet(instance=order)
@@ -802,30 +949,77 @@ def inventory_transaction_list(request):
     }
     return render(request, 'erp/inventory/transactions.html', context)
 
+@login_required
+def stock_alert_list(request):
+    """Open and resolved low stock alerts"""
+    status = request.GET.get('status', 'open')
+    alerts = StockAlert.objects.select_related('product', 'warehouse')
+    if status in ('open', 'resolved'):
+        alerts = alerts.filter(status=status)
+
+    paginator = Paginator(alerts, 20)
+    context = {
+        'alerts': paginator.get_page(request.GET.get('page')),
+        'status': status,
+        'open_count': StockAlert.objects.filter(status='open').count(),
+    }
+    return render(request, 'erp/inventory/alerts.html', context)
+
+@login_required
+def stock_history(request):
+    """Stock on hand at a past date and turnover over the days before it, per warehouse"""
+    warehouses = Warehouse.objects.filter(is_active=True).order_by('name')
+    today = timezone.now().date()
+
+    try:
+        as_of = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        as_of = today
+    try:
+        days = max(1, min(int(request.GET.get('days', 30)), 365))
+    except ValueError:
+        days = 30
+
+    warehouse = None
+    if request.GET.get('warehouse'):
+        warehouse = get_object_or_404(Warehouse, pk=request.GET['warehouse'])
+    elif warehouses:
+        warehouse = warehouses[0]
+
+    rows = []
+    if warehouse:
+        rows = StockHistoryService.turnover(warehouse, as_of - timedelta(days=days - 1), as_of)
+
+    paginator = Paginator(rows, 50)
+    context = {
+        'warehouses': warehouses,
+        'warehouse': warehouse,
+        'as_of': as_of,
+        'days': days,
+        'rows': paginator.get_page(request.GET.get('page')),
+        'built_through': StockHistoryService.built_through(),
+    }
+    return render(request, 'erp/inventory/stock_history.html', context)
+
 @login_required
 def inventory_transaction_create(request):
     if request.method == 'POST':
         form = InventoryTransactionForm(request.POST)
         if form.is_valid():
-            transaction_obj = form.save(commit=False)
-            transaction_obj.created_by = request.user
-
-            with transaction.atomic():
-                transaction_obj.save()
-
-                # Update inventory
-                inventory, created = Inventory.objects.get_or_create(
-                    product=transaction_obj.product,
-                    warehouse=transaction_obj.warehouse,
-                    defaults={'quantity_on_hand': 0, 'quantity_reserved': 0}
+            data = form.cleaned_data
+            try:
+                InventoryService.apply_movement(
+                    data['transaction_type'], data['product'], data['warehouse'], data['quantity'],
+                    user=request.user,
+                    to_warehouse=data.get('to_warehouse'),
+                    unit_cost=data.get('unit_cost') or 0,
+                    reference_number=data.get('reference_number'),
+                    reference_type=data.get('reference_type'),
+                    notes=data.get('notes')
                 )
-
-                if transaction_obj.transaction_type in ['in', 'return']:
-                    inventory.quantity_on_hand += transaction_obj.quantity
-                elif transaction_obj.transaction_type in ['out', 'adjustment']:
-                    inventory.quantity_on_hand -= transaction_obj.quantity
-
-                inventory.save()
+            except ValueError as e:
+                form.add_error('quantity', str(e))
+                return render(request, 'erp/inventory/transaction_create.html', {'form': form})
 
             messages.success(request, 'Inventory transaction recorded successfully.')
             return redirect('erp:inventory_transaction_list')
@@ -941,19 +1135,7 @@ def payment_create(request):
         if form.is_valid():
             payment = form.save(commit=False)
             payment.created_by = request.user
-            
-            # Generate payment number using string-based ordering
-            last_payment = Payment.objects.filter(
-                payment_number__startswith='PAY'
-            ).order_by('-payment_number').first()
-            
-            if last_payment and last_payment.payment_number[3:].isdigit():
-                last_number = int(last_payment.payment_number[3:])
-                next_number = last_number + 1
-            else:
-                next_number = 1
-                
-            payment.payment_number = f"PAY{next_number:06d}"
+            # Payment.save assigns the PAY###### number from the document sequence
             payment.save()
 
             # Auto-mark invoice as paid if linked
@@ -1075,10 +1257,9 @@ def invoice_create(request):
                 invoice.save()
 
                 formset.instance = invoice
-                formset.save()
-
-                # Calculate totals
-                invoice.calculate_totals()
+                with deferred_totals():
+                    formset.save()
+                    defer_totals(Invoice, invoice.pk)
 
                 messages.success(request, f'Invoice {invoice.invoice_number} created successfully!')
                 return redirect('erp:invoice_detail', pk=invoice.pk)
@@ -1140,10 +1321,10 @@ def invoice_update(request, pk):
                 return redirect('erp:invoice_detail', pk=invoice.pk)
         else:
             if form.is_valid() and formset.is_valid():
-                with transaction.atomic():
+                with transaction.atomic(), deferred_totals():
                     form.save()
                     formset.save()
-                    invoice.calculate_totals()
+                    defer_totals(Invoice, invoice.pk)
 
                 messages.success(request, f'Invoice {invoice.invoice_number} updated successfully!')
                 return redirect('erp:invoice_detail', pk=invoice.pk)
@@ -1240,11 +1421,9 @@ def receive_invoice(request):
 
                 invoice.save()
 
-                # Update purchase order status if linked
-                if invoice.purchase_order:
-                    po = invoice.purchase_order
-                    po.status = 'invoiced'
-                    po.save()
+                # A purchase order that is received and now billed is complete
+                if invoice.purchase_order and invoice.purchase_order.status == 'received':
+                    OrderWorkflow.transition(invoice.purchase_order, 'completed', request.user)
 
                 messages.success(request, f'Invoice {invoice.invoice_number} received successfully!')
                 return redirect('erp:invoice_detail', pk=invoice.pk)
@@ -1336,18 +1515,10 @@ def get_customer_data(request, customer_id):
 
 @login_required
 def get_product_data(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
 
-    # Get inventory information
-    try:
-        inventory = Inventory.objects.get(product=product)
-        available_qty = inventory.quantity_available - inventory.quantity_reserved
-        total_qty = inventory.quantity_available
-        reserved_qty = inventory.quantity_reserved
-    except Inventory.DoesNotExist:
-        available_qty = 0
-        total_qty = 0
-        reserved_qty = 0
+    # Stock summed over every warehouse
+    stock = AvailabilityService.get(product.pk)
 
     data = {
         'id': str(product.id),
@@ -1357,30 +1528,82 @@ def get_product_data(request, product_id):
         'cost_price': float(product.cost_price),
         'category': product.category.name if product.category else 'N/A',
         'inventory': {
-            'available': available_qty,
-            'total': total_qty,
-            'reserved': reserved_qty,
-            'low_stock': available_qty <= 10  # Consider low stock threshold
+            'available': stock['available'],
+            'total': stock['on_hand'],
+            'reserved': stock['reserved'],
+            'warehouses': stock['warehouses'],
+            'low_stock': stock['available'] <= stock['reorder_point']
         }
     }
     return JsonResponse(data)
 
+@login_required
+def api_product_availability(request):
+    """Stock summed over warehouses for up to 500 products: ?ids=<uuid>,<uuid>,..."""
+    try:
+        product_ids = [uuid.UUID(value) for value in request.GET.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return JsonResponse({'error': 'ids must be a comma separated list of product ids'}, status=400)
+    if len(product_ids) > 500:
+        return JsonResponse({'error': 'At most 500 products per request'}, status=400)
+
+    return JsonResponse({'products': AvailabilityService.get_many(product_ids)})
+
+@login_required
+def api_import_sales_orders(request):
+    """
+    Bulk-create sales orders from a POSTed JSON body {"orders": [...]} or a
+    text/csv body with one row per order line (see the import_sales_orders command).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests allowed'}, status=405)
+
+    try:
+        if request.content_type == 'text/csv':
+            orders = SalesService.orders_from_rows(csv.DictReader(request.body.decode('utf-8-sig').splitlines()))
+        else:
+            data = json.loads(request.body)
+            orders = data.get('orders') if isinstance(data, dict) else data
+            if not isinstance(orders, list) or not all(isinstance(order, dict) for order in orders):
+                raise ValueError('orders must be a list of objects')
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid import data: {e}'}, status=400)
+    if len(orders) > 5000:
+        return JsonResponse({'error': 'At most 5000 orders per request'}, status=400)
+
+    created, errors = SalesService.import_orders(orders, user=request.user)
+    return JsonResponse({
+        'created': {
+            reference: {'order_number': order.order_number, 'id': str(order.pk)}
+            for reference, order in created.items()
+        },
+        'errors': errors,
+    }, status=201 if created else 400)
+
 # New API endpoint for updating unit price when product is selected
 @login_required
 def api_get_product_price(request, product_id):
-    """API endpoint to get product price and inventory for AJAX calls"""
+    """
+    API endpoint to get product price and inventory for AJAX calls. With
+    ?customer=<id>&quantity=<n> the price is the customer's list price.
+    """
     try:
-        product = get_object_or_404(Product, id=product_id)
-        inventory = Inventory.objects.filter(product=product).first()
+        product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
+        customer = None
+        if request.GET.get('customer'):
+            customer = get_object_or_404(Customer, id=request.GET['customer'])
+        quantity = max(int(request.GET.get('quantity') or 1), 1)
+        stock = AvailabilityService.get(product.pk)
 
         data = {
             'success': True,
-            'unit_price': float(product.unit_price),
+            'unit_price': float(PricingService.price(customer, product, quantity)),
+            'list_price': float(product.unit_price),
             'sku': product.sku,
             'name': product.name,
             'category': product.category.name if product.category else 'N/A',
-            'available_stock': inventory.quantity_available - inventory.quantity_reserved if inventory else 0,
-            'total_stock': inventory.quantity_available if inventory else 0,
+            'available_stock': stock['available'],
+            'total_stock': stock['on_hand'],
         }
     except Exception as e:
         data = {
@@ -1398,7 +1621,20 @@ def sales_order_edit(request, order_id):
     if request.method == 'POST':
         form = SalesOrderForm(request.POST, instance=order)
         if form.is_valid():
-            updated_order = form.save()
+            new_status = form.cleaned_data['status']
+            try:
+                with transaction.atomic():
+                    # Keep the committed status; the workflow moves it below
+                    order.status = SalesOrder.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+                    updated_order = form.save()
+                    SalesService.change_status(updated_order, new_status, request.user)
+            except ValueError as e:
+                form.add_error('status', str(e))
+                return render(request, 'erp/sales/edit.html', {
+                    'form': form,
+                    'order': order,
+                    'title': f'Edit Sales Order {order.order_number}',
+                })
 
             # If status changed to confirmed or shipped, automatically create an invoice
             if (old_status != updated_order.status and
@@ -1432,34 +1668,19 @@ def sales_order_edit(request, order_id):
 
 @login_required
 def financial_reports(request):
-    today = timezone.now()
+    today = timezone.localdate()
     first_day_this_month = today.replace(day=1)
     last_month_end = first_day_this_month - timedelta(days=1)
     first_day_last_month = last_month_end.replace(day=1)
 
-    # Calculate revenue (from sales orders and invoices)
-    this_month_revenue = SalesOrder.objects.filter(
-        order_date__gte=first_day_this_month,
-        status__in=['completed', 'delivered']
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    last_month_revenue = SalesOrder.objects.filter(
-        order_date__gte=first_day_last_month,
-        order_date__lt=first_day_this_month,
-        status__in=['completed', 'delivered']
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    # Calculate expenses (from purchase orders and payments)
-    this_month_expenses = PurchaseOrder.objects.filter(
-        order_date__gte=first_day_this_month,
-        status__in=['completed', 'received']
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-
-    last_month_expenses = PurchaseOrder.objects.filter(
-        order_date__gte=first_day_last_month,
-        order_date__lt=first_day_this_month,
-        status__in=['completed', 'received']
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    # Revenue and expenses come from the month's income statements, served from
+    # FinancialReport while the ledger has not moved
+    this_month = FinancialReportService.get_report('income_statement', first_day_this_month, today, user=request.user)
+    last_month = FinancialReportService.get_report('income_statement', first_day_last_month, last_month_end, user=request.user)
+    this_month_revenue = this_month['total_revenue']
+    last_month_revenue = last_month['total_revenue']
+    this_month_expenses = this_month['total_expenses']
+    last_month_expenses = last_month['total_expenses']
 
     # Calculate changes
     revenue_change = ((this_month_revenue - last_month_revenue) / last_month_revenue * 100) if last_month_revenue > 0 else 0
@@ -1473,13 +1694,13 @@ def financial_reports(request):
     receivables_by_status = Invoice.objects.filter(
         invoice_type='sales'
     ).values('status').annotate(
-        total_amount=Sum('total_amount'),
+        total_amount=Sum(base_amount('total_amount')),
         count=Count('id')
     ).order_by('status')
 
     # Get recent transactions (combining payments and invoices)
     recent_payments = Payment.objects.filter(
-        payment_date__gte=first_day_last_month
+        payment_date__gte=StockHistoryService.day_start(first_day_last_month)
     ).annotate(
         date=F('payment_date'),
         type=Value('Payment', output_field=models.CharField()),
@@ -1489,7 +1710,7 @@ def financial_reports(request):
     ).values('date', 'type', 'reference', 'transaction_amount', 'display_amount')
 
     recent_invoices = Invoice.objects.filter(
-        created_at__gte=first_day_last_month
+        created_at__gte=StockHistoryService.day_start(first_day_last_month)
     ).annotate(
         date=F('created_at'),
         type=Value('Invoice', output_field=models.CharField()),
@@ -1503,7 +1724,7 @@ def financial_reports(request):
     ).values('date', 'type', 'reference', 'transaction_amount', 'display_amount')
 
     # Combine and sort transactions
-    recent_transactions = list(recent_payments.union(recent_invoices))
+    recent_transactions = list(recent_payments.order_by().union(recent_invoices.order_by()))
     recent_transactions.sort(key=lambda x: x['date'], reverse=True)
     recent_transactions = recent_transactions[:10]  # Get only last 10 transactions
 
@@ -1522,6 +1743,115 @@ def financial_reports(request):
 
     return render(request, 'erp/finance/financial_reports.html', context)
 
+@login_required
+def generate_balance_sheet(request):
+    """Generate a balance sheet as of a date, served from the stored report when current"""
+    if request.method == 'POST':
+        try:
+            end_date = datetime.strptime(request.POST.get('end_date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, 'Please enter a valid report date.')
+            return redirect('erp:generate_balance_sheet')
+
+        report_data = FinancialReportService.get_report('balance_sheet', end_date, end_date, user=request.user)
+
+        context = {
+            'report_data': report_data,
+            'end_date': end_date,
+            'total_liabilities_and_equity': (
+                report_data['liabilities']['total_liabilities'] + report_data['equity']['total_equity']
+            ),
+        }
+        return render(request, 'erp/finance/balance_sheet.html', context)
+
+    return render(request, 'erp/finance/generate_balance_sheet.html')
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer"""
+    def write(self, value):
+        return value
+
+
+@login_required
+def general_ledger(request):
+    """Account ledger with running balances, paged by a (date, line id) keyset cursor"""
+    page_size = 100
+    accounts = ChartOfAccounts.objects.filter(is_active=True).order_by('account_code')
+    today = timezone.now().date()
+
+    try:
+        start_date = datetime.strptime(request.GET.get('start_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        start_date = today.replace(month=1, day=1)
+    try:
+        end_date = datetime.strptime(request.GET.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        end_date = today
+
+    context = {
+        'accounts': accounts,
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+    account_code = request.GET.get('account')
+    if not account_code:
+        return render(request, 'erp/finance/general_ledger.html', context)
+    account = get_object_or_404(ChartOfAccounts, account_code=account_code)
+
+    if request.GET.get('format') == 'csv':
+        lines = AccountingService.get_ledger_lines(account, start_date, end_date)
+        writer = csv.writer(_Echo())
+
+        def rows():
+            yield writer.writerow(['Date', 'Entry', 'Description', 'Debit', 'Credit', 'Balance'])
+            for line in lines.iterator(chunk_size=2000):
+                yield writer.writerow([
+                    line.journal.date, line.journal.entry_number,
+                    line.description or line.journal.description,
+                    line.debit, line.credit, line.running_balance
+                ])
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = (
+            f'attachment; filename="ledger_{account.account_code}_{start_date}_{end_date}.csv"'
+        )
+        return response
+
+    # The cursor carries the last line's position and balance, signed so it cannot be edited, and the
+    # account and range it belongs to, so its balance is never carried into another ledger
+    ledger = [account.account_code, start_date.isoformat(), end_date.isoformat()]
+    after = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            *cursor_ledger, cursor_date, cursor_id, cursor_balance = signing.loads(cursor, salt='general_ledger')
+            if cursor_ledger != ledger:
+                raise ValueError('Cursor belongs to another ledger')
+            after = (datetime.strptime(cursor_date, '%Y-%m-%d').date(), cursor_id, Decimal(cursor_balance))
+        except (signing.BadSignature, ValueError, TypeError):
+            messages.error(request, 'The ledger page link is no longer valid.')
+
+    lines = list(AccountingService.get_ledger_lines(account, start_date, end_date, after=after)[:page_size + 1])
+    next_cursor = None
+    if len(lines) > page_size:
+        lines = lines[:page_size]
+        last = lines[-1]
+        next_cursor = signing.dumps(
+            ledger + [last.journal.date.isoformat(), last.id, str(last.running_balance)], salt='general_ledger'
+        )
+
+    context.update({
+        'account': account,
+        'lines': lines,
+        'opening_balance': (
+            AccountingService.calculate_account_balance(account, start_date - timedelta(days=1))
+            if after is None else None
+        ),
+        'next_cursor': next_cursor,
+    })
+    return render(request, 'erp/finance/general_ledger.html', context)
+
 # ==============================================
 # LEAD & EMAIL INQUIRY MANAGEMENT VIEWS
 # ==============================================
@@ -1685,7 +2015,7 @@ def lead_convert(request, lead_id):
             # Optionally create sales order
             if form.cleaned_data.get('create_sales_order'):
                 # Generate order number
-                order_number = f"SO{SalesOrder.objects.count() + 1:06d}"
+                order_number = next_document_number('SO', SalesOrder.objects.all(), 'order_number')
 
                 sales_order = SalesOrder.objects.create(
                     order_number=order_number,
@@ -2238,8 +2568,7 @@ def batch_payment_operations(request):
                             invoice_id=invoice_id if invoice_id else None,
                             amount=Decimal(amount),
                             payment_method=payment_method or 'cash',
-                            created_by=request.user,
-                            payment_number=f"PAY{Payment.objects.count() + 1:06d}"
+                            created_by=request.user
                         )
 
                         # Update invoice if linked